@@ -1,24 +1,111 @@
 from LightsCameraExtremism.agent import Agent
-from LightsCameraExtremism.easyLlm import EasyLLM
+from LightsCameraExtremism.cache import ResponseCache, get_semantic_cache
+from LightsCameraExtremism.easyLlm import EasyLLM, MAX_CACHED_TEMPERATURE
 from LightsCameraExtremism.judge import Judge
+from LightsCameraExtremism.prompts import CONTEXT_MARKER, format_users, keep_newest_within
 
 import json
+import logging
+import re
+from typing import List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Number of most recent posts quoted verbatim; older posts are folded into a rolling summary
+MAX_RECENT_POSTS = 20
+# Token budget for the recent posts quoted verbatim; when it is exceeded the oldest are folded into the
+# rolling summary too
+MAX_CONTEXT_TOKENS = 1500
+# Characters of each older post kept in the rolling summary
+_SUMMARY_POST_CHARS = 80
+# Number of older posts kept in the rolling summary, newest first, so the prompt stays bounded
+MAX_SUMMARY_POSTS = 40
+# Seconds a cached post stays valid for
+POST_CACHE_TTL = 24 * 60 * 60
+
+_SCHEMA_JSON = json.dumps({"POST":"The content of your post","REASONING":"The reasoning behind your post"})
+
+# Instructions shared by every actor, sent as the system prompt so the prefix stays identical across posts.
+_SYSTEM_PROMPT = ("You are a user on a social network, writing a post in character."
+                  "Your messages should make sense in the narrative of the network, and can (but do not have to) '@' mention other users (when doing so use a '@' followed by their username - only mention users who have previously spoken in the conversation.)."
+                  "You are encouraged to respond to other users, and reply to the latest message(s) in the conversation."
+                  "Your post should seem realistic for the given enviroment and be represnetative of the user persona - ensure that this post is in line with the persona and any previous posts from this user."
+                  "Do not shy away from using strong language or hate speech if it is realistic for the user persona."
+                  "Ensure to type like a human, have the occasional typo, use swear words and strong language, and be aggresive where appropriate."
+                  "Be specific, talk about specific details, agendas, plans, dates, people, etc."
+                  "Ensure to use group specific language, codewords, and rhetoric that would be seen on this network."
+                  "Ensure to follow the flow and make sure you match usersnames o the correct post when referncing previous content. Some users can be bystanders and not add to tje conversation talking place. Others may lead new conversations."
+                  "Do not make up any content. Where appropriate add links, emojis, hashtags, and other text based social media content."
+                  "Return your response in raw json, no surrounding text."
+                  )
+
+_QUESTION_PREAMBLE = ("Write your next post on the NETWORK as the user with the given USERNAME, having seen the PREVIOUS POSTS."
+                      "You should act following the user's PERSONA. Make them seem realistic and as close to a human as possible."
+                      "Your post should be written with the given PURPOSE and FEATURES."
+                      "The NETWORK and its USERS are described in your instructions."
+                      )
+
+# Phrases only an assistant would write. A post containing one is sent to the judge even if it is long
+# enough to skip it otherwise, since a user can still quote or mock them.
+_AI_MARKER_RE = re.compile(r"\b(as an ai|as a language model)\b", re.IGNORECASE)
+
+def has_post(response) -> bool:
+    """
+    Whether a model response is a usable post: parsed JSON with a POST field.
+
+    EasyLLM returns the raw text when a response can't be parsed, and that is treated as a rejected draft.
+
+    Args:
+        response: The response from the language model.
+
+    Returns:
+        bool: True if the response is a dict with a POST key.
+    """
+    return isinstance(response, dict) and "POST" in response
+
+def _format_fields(data: dict) -> str:
+    """
+    Format a dict as indented 'key: value' lines, which is more compact for the model than a Python repr.
+
+    Args:
+        data (dict): The fields to format.
+
+    Returns:
+        str: One line per field.
+    """
+    return "\n".join(f"  {key}: {value}" for key, value in data.items())
 
 class Actor(Agent):
-    def __init__(self, llm: EasyLLM):
+    # Maximum number of times a post is regenerated after being rejected
+    MAX_ATTEMPTS = 6
+    # Posts at or below this length are too short to pass the local check and go to the judge
+    MIN_POST_LENGTH = 20
+
+    def __init__(self, llm: EasyLLM, cache_path: str = None):
         """
         Initialize the Actor agent.
 
         Args:
             llm (EasyLLM): An instance of the EasyLLM class.
+            cache_path (str): Path of an on-disk cache of written posts, keyed by channel, user, purpose and
+                features. Posts are reused on an exact or near-identical match for POST_CACHE_TTL seconds,
+                and only when the LLM samples at a temperature of at most MAX_CACHED_TEMPERATURE.
         """
         super().__init__(llm)
+        self._model = self.llm.generate_pydantic_model_from_json_schema("Default", _SCHEMA_JSON)
+        self._judge = Judge(llm)
+
+        self._exact_cache = None
+        self._semantic_cache = None
+        if cache_path and llm.temperature is not None and llm.temperature <= MAX_CACHED_TEMPERATURE:
+            self._exact_cache = ResponseCache(cache_path, ttl=POST_CACHE_TTL)
+            self._semantic_cache = get_semantic_cache(f"{cache_path}.semantic", ttl=POST_CACHE_TTL)
 
     def perform_action(
         self,
         social_network_data: dict,
         username: str,
-        list_of_all_users: list,
+        list_of_all_users: Union[list, dict],
         list_of_all_previous_posts: list,
         post_purpose: str,
         post_features: dict,
@@ -29,76 +116,450 @@ class Actor(Agent):
         Args:
             social_network_data (dict): Data about the social network.
             username (str): The username of the actor.
-            list_of_all_users (list): List of all user data.
+            list_of_all_users (Union[list, dict]): List of all user data, or a dict of it keyed by USERNAME.
             list_of_all_previous_posts (list): List of all previous posts.
             post_purpose (str): The purpose of the post.
             post_features (dict): Features of the post.
 
         Returns:
-            dict: The generated post content and reasoning.
+            dict: The generated post content and reasoning. If no attempt produced a usable post this is the
+                last response, which may not be a dict with a POST key (see has_post).
+
+        Raises:
+            KeyError: If the post isn't cached and the username is not in list_of_all_users.
+        """
+        # Looked up first, since building the prompts counts tokens and so loads the model
+        cache_key = self._cache_key(social_network_data, username, post_purpose, post_features)
+        cached = self._cached_post(cache_key)
+        if cached is not None:
+            return cached
+
+        question, system_prompt = self._build_prompts(
+            social_network_data, username, list_of_all_users, list_of_all_previous_posts, post_purpose, post_features
+        )
+
+        prompt = self.llm.generate_json_prompt(schema=self._model, query=question)
+
+        response = self.llm.ask_question(prompt, system_prompt=system_prompt)
+
+        for attempt in range(1, self.MAX_ATTEMPTS + 1):
+            is_valid, reasoning = self._quick_review(response)
+            if is_valid is None:
+                is_valid, reasoning = self._judgement_verdict(self._judge.enforce(response["POST"]))
+            if is_valid:
+                self._cache_post(cache_key, response)
+                return response
+
+            question = self._feedback_question(question, response, reasoning)
+
+            prompt = self.llm.generate_json_prompt(schema=self._model, query=question)
+
+            response = self.llm.ask_question(prompt, system_prompt=system_prompt)
+
+            logger.debug("Attempt: %d - Reasoning: %s", attempt, reasoning)
+
+        return response
+
+    def perform_actions_batch(
+        self,
+        social_network_data: dict,
+        posts: list,
+        list_of_all_users: Union[list, dict],
+        list_of_all_previous_posts: list,
+    ) -> List[dict]:
+        """
+        Write several posts that don't depend on each other, generating and judging them in batches.
+
+        Every post sees the same previous posts, so the whole batch shares one system prompt. Posts that
+        are rejected are regenerated together, until they all pass or attempts run out.
+
+        Args:
+            social_network_data (dict): Data about the social network.
+            posts (list): SCRIPT entries with USER, PURPOSE and FEATURES keys, e.g. a block from Director.plan_batches.
+            list_of_all_users (Union[list, dict]): List of all user data, or a dict of it keyed by USERNAME.
+            list_of_all_previous_posts (list): List of all posts written before this batch.
+
+        Returns:
+            List[dict]: The generated post content and reasoning for each post, in order. A post that never
+                produced a usable response is its last response, which may not be a dict with a POST key.
+
+        Raises:
+            KeyError: If a post that isn't cached has a user who is not in list_of_all_users.
+        """
+        if not posts:
+            return []
+
+        # Cache hits are found first, so a batch that is all hits never builds prompts or loads the model
+        responses = [None] * len(posts)
+        cache_keys = []
+        to_write = []
+        for index, post in enumerate(posts):
+            cache_key = self._cache_key(social_network_data, post["USER"], post["PURPOSE"], post["FEATURES"])
+            responses[index] = self._cached_post(cache_key)
+            if responses[index] is None:
+                to_write.append(index)
+                cache_keys.append(cache_key)
+
+        if to_write:
+            # Every post in the batch sees the same previous posts, so their context is worked out once
+            context = self._conversation_context(list_of_all_previous_posts)
+
+            questions = []
+            for index in to_write:
+                post = posts[index]
+                question, system_prompt = self._build_prompts(
+                    social_network_data, post["USER"], list_of_all_users, list_of_all_previous_posts, post["PURPOSE"], post["FEATURES"], context
+                )
+                questions.append(question)
+
+            written, accepted = self._write_batch(questions, system_prompt)
+            for index, cache_key, response, is_valid in zip(to_write, cache_keys, written, accepted):
+                responses[index] = response
+                if is_valid:
+                    self._cache_post(cache_key, response)
+
+        return responses
+
+    def _write_batch(self, questions: List[str], system_prompt: str) -> Tuple[List[dict], List[bool]]:
+        """
+        Generate and judge a batch of posts, regenerating rejected ones together.
+
+        Args:
+            questions (List[str]): The question for each post.
+            system_prompt (str): The system prompt shared by the batch.
+
+        Returns:
+            Tuple[List[dict], List[bool]]: The accepted (or final) post content and reasoning for each question,
+                in order, and whether each was accepted.
         """
-        user_data = {}
-        for user_entry in list_of_all_users:
-            if user_entry["USERNAME"] == username:
-                user_data = user_entry
+        responses = self.llm.ask_questions(
+            [self.llm.generate_json_prompt(schema=self._model, query=question) for question in questions],
+            system_prompt=system_prompt,
+        )
+
+        pending = list(range(len(questions)))
+        for attempt in range(1, self.MAX_ATTEMPTS + 1):
+            verdicts = {index: self._quick_review(responses[index]) for index in pending}
+
+            to_judge = [index for index in pending if verdicts[index][0] is None]
+            if to_judge:
+                judgements = self._judge.enforce([responses[index]["POST"] for index in to_judge])
+                for index, judgement in zip(to_judge, judgements):
+                    verdicts[index] = self._judgement_verdict(judgement)
+
+            pending = [index for index in pending if not verdicts[index][0]]
+            if not pending:
                 break
 
-        question = (f"You are a user on a social network with the username '{username}'."
-                  f"You are a user on the social network: '{social_network_data}'."
-                  f"You should act following the following personality and persona: '{user_data}. Make them seem realistic and as close to a human as possible."
-                  f"You are writing a post on the network after seeing the following posts: '{list_of_all_previous_posts}'."
-                  f"Your post should be written with the following purpose: '{post_purpose}' and features {post_features}."
-                  f"Your messages should make sense in the narrative of the network, and can (but do not have to) '@' mention other users (when doing so use a '@' followed by their username - only mention users who have previously spoken in the conversation.)."
-                  f"You are encouraged to respond to other users, and reply to the latest message(s) in the conversation."
-                  f"Your post should seem realistic for the given enviroment and be represnetative of the user persona - ensure that this post is in line with the persona and any previous posts from this user."
-                  f"Do not shy away from using strong language or hate speech if it is realistic for the user persona."
-                  f"Ensure to type like a human, have the occasional typo, use swear words and strong language, and be aggresive where appropriate."
-                  f"Be specific, talk about specific details, agendas, plans, dates, people, etc."
-                  f"Ensure to use group specific language, codewords, and rhetoric that would be seen on this network."
-                  f"Ensure to follow the flow and make sure you match usersnames o the correct post when referncing previous content. Some users can be bystanders and not add to tje conversation talking place. Others may lead new conversations."
-                  f"Do not make up any content. Where appropriate add links, emojis, hashtags, and other text based social media content."
-                  f"Return your response in raw json, no surrounding text."
+            for index in pending:
+                questions[index] = self._feedback_question(questions[index], responses[index], verdicts[index][1])
+                logger.debug("Attempt: %d - Reasoning: %s", attempt, verdicts[index][1])
+
+            regenerated = self.llm.ask_questions(
+                [self.llm.generate_json_prompt(schema=self._model, query=questions[index]) for index in pending],
+                system_prompt=system_prompt,
+            )
+            for index, response in zip(pending, regenerated):
+                responses[index] = response
+
+        rejected = set(pending)
+        return responses, [index not in rejected for index in range(len(questions))]
+
+    @staticmethod
+    def _cache_key(social_network_data: dict, username: str, post_purpose: str, post_features: dict) -> Tuple[str, str]:
+        """
+        Canonical text of the details a cached post is looked up by.
+
+        The channel and user must match exactly, so a post is never reused for another user or network;
+        only the purpose and features are compared by meaning.
+
+        Returns:
+            Tuple[str, str]: The channel and user, and the purpose and features, each as JSON with sorted keys.
+        """
+        identity = json.dumps({"NETWORK": social_network_data, "USERNAME": username}, sort_keys=True, default=str)
+        request = json.dumps({"PURPOSE": post_purpose, "FEATURES": post_features}, sort_keys=True, default=str)
+        return identity, request
+
+    def _cached_post(self, cache_key: Tuple[str, str]) -> Optional[dict]:
+        """
+        Look up a post by exact match, falling back to the most similar cached request from the same user.
+
+        Returns:
+            Optional[dict]: The cached post, or None if there is none or caching is off.
+        """
+        if self._exact_cache is None:
+            return None
+
+        identity, request = cache_key
+        cached = self._exact_cache.get(ResponseCache.make_key(identity, request))
+        if cached is None:
+            cached = self._semantic_cache.get(request, partition=identity)
+        return cached
+
+    def _cache_post(self, cache_key: Tuple[str, str], response: dict) -> None:
+        """
+        Store an accepted post in the exact and semantic caches, when caching is on.
+        """
+        if self._exact_cache is None or not isinstance(response, dict):
+            return
+
+        identity, request = cache_key
+        self._exact_cache.set(ResponseCache.make_key(identity, request), response)
+        self._semantic_cache.set(request, response, partition=identity)
 
+    def _build_prompts(
+        self,
+        social_network_data: dict,
+        username: str,
+        list_of_all_users: Union[list, dict],
+        list_of_all_previous_posts: list,
+        post_purpose: str,
+        post_features: dict,
+        context: Optional[Tuple[str, str]] = None,
+    ) -> Tuple[str, str]:
+        """
+        Build the per-post question and the system prompt for a post.
+
+        Args:
+            context (Optional[Tuple[str, str]]): The result of _conversation_context for
+                list_of_all_previous_posts, if already worked out.
+
+        Returns:
+            Tuple[str, str]: The question and the system prompt.
+        """
+        if isinstance(list_of_all_users, dict):
+            user_data = list_of_all_users.get(username, {})
+        else:
+            user_data = {}
+            for user_entry in list_of_all_users:
+                if user_entry["USERNAME"] == username:
+                    user_data = user_entry
+                    break
+
+        if not user_data:
+            # Without a persona the post would be generic, so don't spend a generation on it
+            raise KeyError(f"unknown username {username!r}")
+
+        recent_posts, summary = context or self._conversation_context(list_of_all_previous_posts)
+        # The network and its users are the same for every post in a script, so they go in the system
+        # prompt ahead of the summary, keeping the long stable part of the prompt byte-identical
+        system_prompt = (_SYSTEM_PROMPT + CONTEXT_MARKER
+                         + f"NETWORK:\n{_format_fields(social_network_data)}\n"
+                         + f"USERS:\n{format_users(list_of_all_users)}\n"
+                         )
+        if summary:
+            system_prompt = system_prompt + f"Earlier in the conversation: {summary}"
+
+        # Most stable details first, so consecutive posts share as long a prefix as possible
+        question = (_QUESTION_PREAMBLE + CONTEXT_MARKER
+                  + f"USERNAME: {username}\n"
+                  + f"PERSONA:\n{_format_fields(user_data)}\n"
+                  + f"PREVIOUS POSTS:\n{recent_posts}\n"
+                  + f"PURPOSE: {post_purpose}\n"
+                  + f"FEATURES:\n{_format_fields(post_features)}\n"
                   )
-        
-        schema = {"POST":"The content of your post","REASONING":"The reasoning behind your post"}
 
-        schema = json.dumps(schema)
+        return question, system_prompt
+
+    def _conversation_context(self, list_of_all_previous_posts: list) -> Tuple[str, str]:
+        """
+        Split the previous posts into the recent ones quoted verbatim and a summary of everything before them.
+
+        Args:
+            list_of_all_previous_posts (list): List of all previous posts.
+
+        Returns:
+            Tuple[str, str]: The recent post lines and the rolling summary of older posts.
+        """
+        lines = self._recent_post_lines(list_of_all_previous_posts)
+        summary = self._summarise_posts(list_of_all_previous_posts[:len(list_of_all_previous_posts) - len(lines)])
+        return "\n".join(lines), summary
 
-        model = self.llm.generate_pydantic_model_from_json_schema("Default", schema)
+    def _recent_post_lines(self, list_of_all_previous_posts: list) -> List[str]:
+        """
+        Format the most recent posts, keeping as many of the last MAX_RECENT_POSTS as fit in MAX_CONTEXT_TOKENS.
 
-        prompt = self.llm.generate_json_prompt(schema=model, query=question)
+        Long posts would otherwise make the prompt, and so the prefill, grow with the conversation.
 
-        response = self.llm.ask_question(prompt)
+        Args:
+            list_of_all_previous_posts (list): List of all previous posts.
 
-        is_valid = False
-        attempts  = 0
-        judge = Judge(self.llm)
+        Returns:
+            List[str]: One line per post, oldest first.
+        """
+        lines = [
+            f"  @{post.get('USER', '?')}: {post.get('POST', '')}" for post in list_of_all_previous_posts[-MAX_RECENT_POSTS:]
+        ]
+        return keep_newest_within(lines, MAX_CONTEXT_TOKENS, self.llm)
 
-        while not is_valid:
-            if attempts >5:
-                break
-                
-            judgement = judge.enforce(response["POST"])
-            if "ai" in str(judgement["RESULT"]).lower():
-                is_valid = False
-            else:
-                
-                is_valid = bool(judgement["RESULT"])
-            
+    def _quick_review(self, response: dict) -> Tuple[Optional[bool], str]:
+        """
+        Check a post locally, passing it without the judge when nothing looks off.
+
+        Responses that aren't a post at all are rejected; short posts and posts with assistant phrasing are
+        left to the judge.
+
+        Returns:
+            Tuple[Optional[bool], str]: Whether the post is valid (None if the judge is needed) and the reasoning.
+        """
+        if not has_post(response):
+            return False, "The response was not raw JSON with a POST field."
+
+        post = str(response["POST"])
+
+        if _AI_MARKER_RE.search(post):
+            # Unsure, so let the judge decide
+            return None, ""
+        if len(post) > self.MIN_POST_LENGTH:
+            # Nothing obviously wrong, so skip the judge round-trip
+            return True, ""
+        return None, ""
+
+    @staticmethod
+    def _judgement_verdict(judgement: dict) -> Tuple[bool, str]:
+        """
+        Turn a Judge response into whether the post is valid and the feedback to act on.
+
+        Returns:
+            Tuple[bool, str]: Whether the post is valid and the judge's feedback.
+        """
+        if not isinstance(judgement, dict):
+            # The judge's reply couldn't be parsed, so there is no verdict to retry on
+            return True, ""
+
+        # RESULT is True when the judge thinks the post is AI generated, so that is what gets it rejected
+        is_valid = not Actor._is_ai_generated(judgement.get("RESULT"))
+        return is_valid, judgement.get("FEEDBACK", "")
+
+    @staticmethod
+    def _is_ai_generated(result) -> bool:
+        """
+        Read the judge's RESULT field as a boolean, accepting the string forms models often return.
+
+        Returns:
+            bool: True if the judge flagged the text as AI generated; False for anything else, including a
+                missing or unrecognised value.
+        """
+        if isinstance(result, str):
+            return result.strip().strip(".").lower() in ("true", "yes")
+        return result is True or (isinstance(result, (int, float)) and result == 1)
+
+    @staticmethod
+    def _feedback_question(question: str, response: dict, reasoning: str) -> str:
+        """
+        Append the feedback on a rejected post to the question.
+
+        Returns:
+            str: The question to regenerate the post with.
+        """
+        if not has_post(response):
+            return question + f"Your previous response could not be used. This was for the following reasons '{reasoning}'. Please provide a new post."
+        return question + f"You previously provided the post '{response['POST']}' which was deemed not realistic as a human written post. This was for the following reasons '{reasoning}'. Please provide a new post."
+
+    @staticmethod
+    def _summarise_posts(evicted_posts: list) -> str:
+        """
+        Summarise the posts that have fallen out of the recent window, one truncated line per post.
+
+        Only the newest MAX_SUMMARY_POSTS are kept, so the summary doesn't grow with the script.
+
+        Args:
+            evicted_posts (list): The previous posts older than the ones quoted verbatim, oldest first.
+
+        Returns:
+            str: The summary of posts older than the recent window.
+        """
+        return "".join(
+            f"@{post.get('USER', '?')}: {str(post.get('POST', ''))[:_SUMMARY_POST_CHARS]}\n"
+            for post in evicted_posts[-MAX_SUMMARY_POSTS:]
+        )
+
+    async def aperform_action(
+        self,
+        social_network_data: dict,
+        username: str,
+        list_of_all_users: Union[list, dict],
+        list_of_all_previous_posts: list,
+        post_purpose: str,
+        post_features: dict,
+    ) -> dict:
+        """
+        Asynchronous variant of perform_action.
+
+        Args:
+            social_network_data (dict): Data about the social network.
+            username (str): The username of the actor.
+            list_of_all_users (Union[list, dict]): List of all user data, or a dict of it keyed by USERNAME.
+            list_of_all_previous_posts (list): List of all previous posts.
+            post_purpose (str): The purpose of the post.
+            post_features (dict): Features of the post.
+
+        Returns:
+            dict: The generated post content and reasoning.
+        """
+        draft = await self.adraft_action(
+            social_network_data, username, list_of_all_users, list_of_all_previous_posts, post_purpose, post_features
+        )
+        return await self.areview_action(*draft)
+
+    async def adraft_action(
+        self,
+        social_network_data: dict,
+        username: str,
+        list_of_all_users: Union[list, dict],
+        list_of_all_previous_posts: list,
+        post_purpose: str,
+        post_features: dict,
+    ) -> Tuple[str, str, dict]:
+        """
+        Generate a candidate post without judging it, so judgement can overlap with other work.
+
+        Args:
+            social_network_data (dict): Data about the social network.
+            username (str): The username of the actor.
+            list_of_all_users (Union[list, dict]): List of all user data, or a dict of it keyed by USERNAME.
+            list_of_all_previous_posts (list): List of all previous posts.
+            post_purpose (str): The purpose of the post.
+            post_features (dict): Features of the post.
+
+        Returns:
+            Tuple[str, str, dict]: The question, the system prompt and the candidate post, to pass to areview_action.
+        """
+        question, system_prompt = self._build_prompts(
+            social_network_data, username, list_of_all_users, list_of_all_previous_posts, post_purpose, post_features
+        )
 
+        prompt = self.llm.generate_json_prompt(schema=self._model, query=question)
+
+        response = await self.llm.aask_question(prompt, system_prompt=system_prompt)
+
+        return question, system_prompt, response
+
+    async def areview_action(self, question: str, system_prompt: str, response: dict) -> dict:
+        """
+        Judge a candidate post from adraft_action, regenerating it until it passes or attempts run out.
+
+        Args:
+            question (str): The question the candidate was generated from.
+            system_prompt (str): The system prompt the candidate was generated with.
+            response (dict): The candidate post.
+
+        Returns:
+            dict: The accepted (or final) post content and reasoning.
+        """
+        for attempt in range(1, self.MAX_ATTEMPTS + 1):
+            is_valid, reasoning = self._quick_review(response)
+            if is_valid is None:
+                is_valid, reasoning = self._judgement_verdict(await self._judge.aenforce(response["POST"]))
             if is_valid:
-                break
+                return response
+
+            question = self._feedback_question(question, response, reasoning)
 
-            reasoning = judgement["FEEDBACK"]
-            
-            question = question + f"You previously provided the post '{response['POST']}' which was deemed not realistic as a human written post. This was for the following reasons '{reasoning}'. Please provide a new post."
+            prompt = self.llm.generate_json_prompt(schema=self._model, query=question)
 
-            prompt = self.llm.generate_json_prompt(schema=model, query=prompt)
+            response = await self.llm.aask_question(prompt, system_prompt=system_prompt)
 
-            response = self.llm.ask_question(prompt)
+            logger.debug("Attempt: %d - Reasoning: %s", attempt, reasoning)
 
-            attempts = attempts + 1
-            print(f"Attempt: {attempts} - Reasoning: {reasoning}")
-        
         return response
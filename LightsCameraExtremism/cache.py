@@ -0,0 +1,237 @@
+import functools
+import hashlib
+import os
+import shelve
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+# One lock per database path for the whole process, so caches created separately (e.g. by the channels of
+# a sweep, each on its own thread) never open the same shelve file at once
+_PATH_LOCKS: Dict[str, threading.Lock] = {}
+_PATH_LOCKS_GUARD = threading.Lock()
+
+# Sentence-transformers models already loaded, keyed by name, shared by every SemanticCache
+_EMBEDDING_MODELS: Dict[str, Any] = {}
+_EMBEDDING_MODELS_LOCK = threading.Lock()
+
+def _path_lock(path: str) -> threading.Lock:
+    """
+    Returns the process-wide lock guarding the shelve database at a path.
+
+    Args:
+        path (str): Path of the shelve database.
+
+    Returns:
+        threading.Lock: The same lock for every caller using this path.
+    """
+    with _PATH_LOCKS_GUARD:
+        return _PATH_LOCKS.setdefault(os.path.abspath(path), threading.Lock())
+
+
+class ResponseCache:
+    """
+    A small on-disk cache of LLM responses keyed by a hash of everything that shaped the prompt.
+    """
+
+    def __init__(self, path: str, ttl: Optional[float] = None) -> None:
+        """
+        Initializes the cache.
+
+        Args:
+            path (str): Path of the shelve database holding the cached responses.
+            ttl (Optional[float]): Seconds a response stays valid for, or None to keep responses forever.
+        """
+        self.path = path
+        self.ttl = ttl
+        self._lock = _path_lock(path)
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """
+        Builds a cache key from the parts of a request.
+
+        Args:
+            *parts (Any): The values that determine the response, such as the prompts and sampling settings.
+
+        Returns:
+            str: A hex digest identifying the request.
+        """
+        digest = hashlib.blake2b(digest_size=32)
+        for part in parts:
+            digest.update(repr(part).encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Any:
+        """
+        Looks up a cached response.
+
+        Args:
+            key (str): The key returned by make_key.
+
+        Returns:
+            Any: The cached response, or None if there is none.
+        """
+        with self._lock, shelve.open(self.path) as cache:
+            entry = cache.get(key)
+
+        # Entries are (stored_at, response) pairs; anything else predates the TTL and is ignored
+        if not isinstance(entry, tuple):
+            return None
+        stored_at, response = entry
+        if self.ttl is not None and time.time() - stored_at > self.ttl:
+            return None
+        return response
+
+    def set(self, key: str, response: Any) -> None:
+        """
+        Stores a response.
+
+        Args:
+            key (str): The key returned by make_key.
+            response (Any): The response to store.
+        """
+        with self._lock, shelve.open(self.path) as cache:
+            cache[key] = (time.time(), response)
+
+
+class SemanticCache:
+    """
+    An on-disk cache of responses looked up by the meaning of the request rather than its exact text.
+
+    Requests are embedded with a sentence-transformers model and a cached response is returned when a
+    stored request is at least `threshold` cosine-similar. Entries are split into partitions that must match
+    exactly (e.g. the channel and user a post is written for), so only the part of a request that may vary
+    is compared by meaning.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: Optional[float] = None,
+        threshold: float = 0.95,
+        model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+    ) -> None:
+        """
+        Initializes the cache, loading any stored entries.
+
+        Args:
+            path (str): Path of the shelve database holding the embeddings and responses.
+            ttl (Optional[float]): Seconds a response stays valid for, or None to keep responses forever.
+            threshold (float): Minimum cosine similarity for a stored request to count as a match.
+            model_name (str): The sentence-transformers model used to embed requests.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.threshold = threshold
+        self.model_name = model_name
+        self._lock = _path_lock(path)
+
+        # Per partition, unit-length embeddings stacked into one matrix, so a lookup is a single
+        # matrix-vector product, and the (stored_at, response) entries matching its rows
+        self._partitions = {}
+        with self._lock, shelve.open(self.path) as cache:
+            for key in cache:
+                entry = cache[key]
+                # Entries are (partition, embedding, stored_at, response); older unpartitioned ones are ignored
+                if isinstance(entry, tuple) and len(entry) == 4:
+                    self._add(*entry)
+
+    def _embed(self, text: str) -> np.ndarray:
+        """
+        Embeds a request, loading the embedding model on first use.
+
+        Args:
+            text (str): The request text.
+
+        Returns:
+            np.ndarray: The unit-length embedding.
+        """
+        with _EMBEDDING_MODELS_LOCK:
+            model = _EMBEDDING_MODELS.get(self.model_name)
+            if model is None:
+                # Imported here since sentence-transformers is slow to import and only needed by this cache
+                from sentence_transformers import SentenceTransformer
+
+                model = _EMBEDDING_MODELS[self.model_name] = SentenceTransformer(self.model_name)
+        return model.encode(text, normalize_embeddings=True).astype(np.float32)
+
+    def _add(self, partition: str, embedding: np.ndarray, stored_at: float, response: Any) -> None:
+        """
+        Adds an entry to the in-memory index of its partition.
+        """
+        embeddings, entries = self._partitions.get(partition, (None, []))
+        if embeddings is None:
+            embeddings = embedding[None, :]
+        else:
+            embeddings = np.vstack([embeddings, embedding])
+        entries.append((stored_at, response))
+        self._partitions[partition] = (embeddings, entries)
+
+    def get(self, text: str, partition: str = "") -> Any:
+        """
+        Looks up the response to the most similar stored request in a partition.
+
+        Args:
+            text (str): The request text.
+            partition (str): Only requests stored under exactly this partition are considered.
+
+        Returns:
+            Any: The cached response, or None if no stored request is similar enough.
+        """
+        with self._lock:
+            if partition not in self._partitions:
+                return None
+
+            embeddings, entries = self._partitions[partition]
+            similarities = embeddings @ self._embed(text)
+            now = time.time()
+            for index in np.argsort(similarities)[::-1]:
+                if similarities[index] < self.threshold:
+                    break
+                stored_at, response = entries[index]
+                if self.ttl is None or now - stored_at <= self.ttl:
+                    return response
+            return None
+
+    def set(self, text: str, response: Any, partition: str = "") -> None:
+        """
+        Stores the response to a request.
+
+        Args:
+            text (str): The request text.
+            response (Any): The response to store.
+            partition (str): The partition the request is stored under.
+        """
+        with self._lock:
+            entry = (partition, self._embed(text), time.time(), response)
+            self._add(*entry)
+            with shelve.open(self.path) as cache:
+                cache[ResponseCache.make_key(partition, text)] = entry
+
+@functools.lru_cache(maxsize=None)
+def get_semantic_cache(
+    path: str,
+    ttl: Optional[float] = None,
+    threshold: float = 0.95,
+    model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+) -> SemanticCache:
+    """
+    Returns a shared SemanticCache for the given settings, creating it on first use.
+
+    Each SemanticCache keeps its own in-memory index of the database, so callers sharing a path share one
+    instance to see each other's entries and load the stored ones only once.
+
+    Args:
+        path (str): Path of the shelve database holding the embeddings and responses.
+        ttl (Optional[float]): Seconds a response stays valid for, or None to keep responses forever.
+        threshold (float): Minimum cosine similarity for a stored request to count as a match.
+        model_name (str): The sentence-transformers model used to embed requests.
+
+    Returns:
+        SemanticCache: The shared instance for these settings.
+    """
+    return SemanticCache(path, ttl, threshold, model_name)
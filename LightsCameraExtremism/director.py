@@ -1,7 +1,133 @@
+from LightsCameraExtremism.actor import has_post
 from LightsCameraExtremism.agent import Agent
 from LightsCameraExtremism.easyLlm import EasyLLM
+from LightsCameraExtremism.prompts import CONTEXT_MARKER, format_users, keep_newest_within
 
+import asyncio
 import json
+import logging
+
+from pydantic import BaseModel
+from typing import Type
+
+logger = logging.getLogger(__name__)
+
+# Scripts up to this many posts are written, post bodies included, in a single call
+SINGLE_CALL_MAX_POSTS = 40
+# Posts requested per call when a longer script is written in batches
+POSTS_PER_CALL = 20
+# Token budget for the most recent posts quoted in a continuation prompt; the oldest are left out first
+CONTINUATION_CONTEXT_TOKENS = 2000
+# Rough token cost of each part of a script response, used to size the generation budget to the script
+# asked for: the JSON scaffolding, each USERS entry, and each SCRIPT entry with and without its post text
+SCRIPT_OVERHEAD_TOKENS = 256
+TOKENS_PER_USER = 80
+TOKENS_PER_SCRIPT_ENTRY = 90
+TOKENS_PER_SCRIPT_ENTRY_WITH_CONTENT = 160
+
+_SCRIPT_SCHEMA_JSON = json.dumps({
+    "USERS": [{"USERNAME":"the user's username","BIO":"the user's social media bio/ description/ information about themselves", "PERSONALITY":"The user's personality"}], "SCRIPT": [{"USER":"Name of he user - make it realistic for a network like Twitter", "TIME":"The dd/mm/yy hh/mm/ss of the post", "PURPOSE":"The purpose of the post", "FEATURES": {"TOXICITY":"the toxicity of the message - high, medium, low, etc", "SENTIMENT":"the sentiment of the message", "EMOTION":"the emotion of the message"}}]
+})
+
+_SCRIPT_ENTRY_WITH_CONTENT = {"USER":"Name of he user - make it realistic for a network like Twitter", "TIME":"The dd/mm/yy hh/mm/ss of the post", "PURPOSE":"The purpose of the post", "FEATURES": {"TOXICITY":"the toxicity of the message - high, medium, low, etc", "SENTIMENT":"the sentiment of the message", "EMOTION":"the emotion of the message"}, "CONTENT":"The full text of the post, as written by the user"}
+
+_SCRIPT_WITH_CONTENT_SCHEMA_JSON = json.dumps({
+    "USERS": [{"USERNAME":"the user's username","BIO":"the user's social media bio/ description/ information about themselves", "PERSONALITY":"The user's personality"}], "SCRIPT": [_SCRIPT_ENTRY_WITH_CONTENT]
+})
+
+_SCRIPT_CONTINUATION_SCHEMA_JSON = json.dumps({"SCRIPT": [_SCRIPT_ENTRY_WITH_CONTENT]})
+
+# Static instructions lead each prompt and the per-channel details follow the context marker, so the
+# long instruction block is an identical prefix across channels.
+_SCRIPT_PREAMBLE = ("You are an exper social scientist. You have previously exammined countless social networks."
+                    "Write a play-by-play script of interactions on a social network - similar to Twitter - for the channel described in the context below."
+                    "Ensure that the network you make conforms to the following information and feels realistic. Do not shy away from language (such as swear words or hate speech) that would be present in the given environment."
+                    "Use real information to populate the network, i.e. use real usernames, examples, etc. Make them feel freal and based on the network in question. Ensure to add variety."
+                    "The channel should have exactly NUMBER_OF_USERS users all with varying personalities, personas, and opinions - however, the channel as a whole should conform to the CHANNEL_VIBE."
+                    "Users can only interact with each other through text based posts, they can share URLs, hashtags, and can mention other users in their posts."
+                    "In the script make sure to structure it as a narrative and have blocks of messages to mimic real world interaction, the script should feel like a real dump from a social network."
+                    )
+
+_SCRIPT_EPILOGUE = ("The narrative of your play-by-play script should be centered around the STORY_AGENDA."
+                    "The script should be STORY_LENGTH posts in length."
+                    "Usernames should be ones that you'd expect to see on a real social network and be serious real examples."
+                    "The PURPOSE field, should include a variety of different purposes, such as sharing news, asking questions, making jokes, etc - but should all be things the user can do in a text post."
+                    "Ensure to only add users to the script that you mentioned in the user list."
+                    "Make everything highly realistic."
+                    "All posts should be in chronological time order."
+                    "Provid the whole json, for all entries."
+                    "Return your response in raw json, no surrounding text."
+                    )
+
+_SCRIPT_INSTRUCTIONS = (_SCRIPT_PREAMBLE
+                        + "In your script do not include the messaging said by users, only when they message and highlighting different fetaures of the post, such as '['toxicity', 'sentiment', 'emotion']."
+                        + "The script you are writing should have several small conversations baked in and should have users popping in to talk about other things where appropriate. it should also include multiple time blocks."
+                        + "Ensure to add a good degree of detail to the script, and make sure to include a variety of different users, information, and variety."
+                        + "Timing's should be accurate and representative of the real world."
+                        + "Base everything off a real world social network like Twitter or Reddit, and create usernames, posts, content, etc accordingly."
+                        + _SCRIPT_EPILOGUE
+                        )
+
+_SCRIPT_WITH_POSTS_INSTRUCTIONS = (_SCRIPT_PREAMBLE
+                                   + "Include the text of every post. The CONTENT of each post should be written in the voice of its user, in line with their persona, purpose and features, and type like a human - with the occasional typo, strong language, and group specific language where appropriate."
+                                   + _SCRIPT_EPILOGUE
+                                   )
+
+_CONTINUATION_INSTRUCTIONS = ("You are an exper social scientist. You are continuing a play-by-play script of interactions on a social network - similar to Twitter - including the text of every post."
+                              "The channel, its users, and the most recent posts in the script are given in the context below. Only use these users."
+                              "Continue the script with the next STORY_LENGTH posts, following on in chronological time order and centered around the STORY_AGENDA. Do not repeat earlier posts."
+                              "The CONTENT of each post should be written in the voice of its user, in line with their persona, purpose and features, and type like a human."
+                              "Return your response in raw json, no surrounding text."
+                              )
+
+def _channel_context(
+    channel_name: str,
+    channel_bio: str,
+    number_of_users: int,
+    channel_vibe: str,
+    story_agenda: str,
+    story_length: int,
+) -> str:
+    """
+    Format the per-channel details that follow the static instructions.
+
+    Returns:
+        str: The channel details, one field per line.
+    """
+    return (f"CHANNEL_NAME: {channel_name}\n"
+            f"CHANNEL_BIO: {channel_bio}\n"
+            f"NUMBER_OF_USERS: {number_of_users}\n"
+            f"CHANNEL_VIBE: {channel_vibe}\n"
+            f"STORY_AGENDA: {story_agenda}\n"
+            f"STORY_LENGTH: {story_length}\n"
+            )
+
+def _post_line(post: dict) -> str:
+    """
+    Format a SCRIPT entry as a single line with its time, user and text.
+
+    Args:
+        post (dict): A SCRIPT entry with CONTENT.
+
+    Returns:
+        str: The post as one line.
+    """
+    return f"  {post.get('TIME', '?')} @{post.get('USER', '?')}: {post.get('CONTENT', '')}"
+
+def _script_token_budget(number_of_users: int, number_of_posts: int, with_content: bool) -> int:
+    """
+    Estimates how many tokens a script response needs so it isn't cut off mid-JSON.
+
+    Args:
+        number_of_users (int): USERS entries in the response (0 for continuations, which don't repeat them).
+        number_of_posts (int): SCRIPT entries in the response.
+        with_content (bool): Whether every SCRIPT entry carries the text of its post.
+
+    Returns:
+        int: The token budget for the response.
+    """
+    per_entry = TOKENS_PER_SCRIPT_ENTRY_WITH_CONTENT if with_content else TOKENS_PER_SCRIPT_ENTRY
+    return SCRIPT_OVERHEAD_TOKENS + number_of_users * TOKENS_PER_USER + number_of_posts * per_entry
 
 class Director(Agent):
     def __init__(self, llm: EasyLLM):
@@ -35,43 +161,221 @@ class Director(Agent):
 
         Returns:
             dict: The generated script data.
+
+        Raises:
+            pydantic.ValidationError: If the response doesn't match the script schema.
         """
-        
-        message_features = ["toxicity", "sentiment", "emotion"]
-
-        prompt = (f"You are an exper social scientist. You have previously exammined countless social networks."
-                  f"Write a play-by-play script of interactions on a social network - similar to Twitter."
-                  f"Ensure that the network you make conforms to the following information and feels realistic. Do not shy away from language (such as swear words or hate speech) that would be present in the given environment."
-                  f"Use real information to populate the network, i.e. use real usernames, examples, etc. Make them feel freal and based on the network in question. Ensure to add variety."
-                  f"The social network is channel called '{channel_name}' and is defined as '{channel_bio}'."
-                  f"The channel should have exactly '{number_of_users}' users all with varying personalities, personas, and opinions - however, the channel as a whole should conform to '{channel_vibe}'."
-                  f"Users can only interact with each other through text based posts, they can share URLs, hashtags, and can mention other users in their posts."
-                  f"In the script make sure to structure it as a narrative and have blocks of messages to mimic real world interaction, the script should feel like a real dump from a social network."
-                  f"In your script do not include the messaging said by users, only when they message and highlighting different fetaures of the post, such as '{message_features}."
-                  f"The narrative of your play-by-play script should be centered around '{story_agenda}'."
-                  f"The script should be '{story_length}' posts in length."
-                  f"Usernames should be ones that you'd expect to see on a real social network and be serious real examples."
-                  f"The PURPOSE field, should include a variety of different purposes, such as sharing news, asking questions, making jokes, etc - but should all be things the user can do in a text post."
-                  f"The script you are writing should have several small conversations baked in and should have users popping in to talk about other things where appropriate. it should also include multiple time blocks."
-                  f"Ensure to add a good degree of detail to the script, and make sure to include a variety of different users, information, and variety."
-                  f"Ensure to only add users to the script that you mentioned in the user list."
-                  f"Make everything highly realistic."
-                  f"All posts should be in chronological time order."
-                  f"Provid the whole json, for all entries."
-                  f"Timing's should be accurate and representative of the real world."
-                  f"Base everything off a real world social network like Twitter or Reddit, and create usernames, posts, content, etc accordingly."
-                  f"Return your response in raw json, no surrounding text."
-                  )
-
-        schema = {
-        "USERS": [{"USERNAME":"the user's username","BIO":"the user's social media bio/ description/ information about themselves", "PERSONALITY":"The user's personality"}], "SCRIPT": [{"USER":"Name of he user - make it realistic for a network like Twitter", "TIME":"The dd/mm/yy hh/mm/ss of the post", "PURPOSE":"The purpose of the post", "FEATURES": {"TOXICITY":"the toxicity of the message - high, medium, low, etc", "SENTIMENT":"the sentiment of the message", "EMOTION":"the emotion of the message"}}]
-        }
-
-        schema = json.dumps(schema)
-
-        model = self.llm.generate_pydantic_model_from_json_schema("Default", schema)
+        prompt = _SCRIPT_INSTRUCTIONS + CONTEXT_MARKER + _channel_context(
+            channel_name, channel_bio, number_of_users, channel_vibe, story_agenda, story_length
+        )
+
+        model = self.llm.generate_pydantic_model_from_json_schema("Default", _SCRIPT_SCHEMA_JSON)
 
         prompt = self.llm.generate_json_prompt(schema=model, query=prompt)
 
-        response = self.llm.ask_question(prompt)
-        return response
+        budget = self._token_budget(number_of_users, story_length, with_content=False)
+
+        return self._validated(model, self.llm.ask_question(prompt, max_new_tokens=budget))
+
+    def write_script_with_posts(
+        self,
+        channel_name: str,
+        channel_bio: str,
+        number_of_users: int,
+        channel_vibe: str,
+        story_agenda: str,
+        story_length: int,
+    ) -> dict:
+        """
+        Write a script of interactions on a social network including the text of every post.
+
+        This replaces the per-post Actor calls with one call for scripts of up to SINGLE_CALL_MAX_POSTS
+        posts; longer scripts are written POSTS_PER_CALL posts at a time, each call continuing the last.
+
+        Args:
+            channel_name (str): Name of the social network channel.
+            channel_bio (str): Bio of the channel.
+            number_of_users (int): Number of users on the network.
+            channel_vibe (str): Overall vibe or atmosphere of the channel.
+            story_agenda (str): Central narrative or agenda.
+            story_length (int): Number of posts in the script.
+
+        Returns:
+            dict: The generated script data, with a CONTENT field on every SCRIPT entry.
+
+        Raises:
+            pydantic.ValidationError: If a response doesn't match the script schema.
+        """
+        first_batch = story_length if story_length <= SINGLE_CALL_MAX_POSTS else POSTS_PER_CALL
+
+        prompt = _SCRIPT_WITH_POSTS_INSTRUCTIONS + CONTEXT_MARKER + _channel_context(
+            channel_name, channel_bio, number_of_users, channel_vibe, story_agenda, first_batch
+        )
+
+        model = self.llm.generate_pydantic_model_from_json_schema("Default", _SCRIPT_WITH_CONTENT_SCHEMA_JSON)
+
+        prompt = self.llm.generate_json_prompt(schema=model, query=prompt)
+
+        budget = self._token_budget(number_of_users, first_batch, with_content=True)
+
+        response = self._validated(model, self.llm.ask_question(prompt, max_new_tokens=budget))
+
+        users = response["USERS"]
+        script = list(response["SCRIPT"])
+
+        if len(script) < story_length:
+            model = self.llm.generate_pydantic_model_from_json_schema("Default", _SCRIPT_CONTINUATION_SCHEMA_JSON)
+
+        while len(script) < story_length:
+            batch_length = min(POSTS_PER_CALL, story_length - len(script))
+
+            prompt = (_CONTINUATION_INSTRUCTIONS + CONTEXT_MARKER + _channel_context(
+                          channel_name, channel_bio, number_of_users, channel_vibe, story_agenda, batch_length
+                      )
+                      + f"USERS:\n{format_users(users)}\n"
+                      + f"MOST RECENT POSTS:\n{self._recent_posts(script)}\n"
+                      )
+
+            prompt = self.llm.generate_json_prompt(schema=model, query=prompt)
+
+            budget = self._token_budget(0, batch_length, with_content=True)
+
+            continuation = self._validated(model, self.llm.ask_question(prompt, max_new_tokens=budget))["SCRIPT"]
+            if not continuation:
+                break
+            script.extend(continuation[:batch_length])
+
+        return {"USERS": users, "SCRIPT": script}
+
+    async def run_script_async(
+        self,
+        actor,
+        social_network_data: dict,
+        users: list,
+        script: list,
+        max_concurrency: int = 4,
+    ) -> list:
+        """
+        Have an actor write every post in a script, generating independent posts concurrently.
+
+        The script is split into blocks in which no user posts twice. Posts within a block all see the
+        same history (everything written before the block) and are drafted concurrently; as each draft
+        arrives its judgement is started straight away, so judging overlaps with the remaining drafts.
+        Judgements are only awaited when the block is committed to the history, and blocks are processed
+        in order so later posts can respond to earlier ones.
+
+        Args:
+            actor (Actor): The actor used to write each post.
+            social_network_data (dict): Data about the social network.
+            users (list): List of all user data.
+            script (list): The SCRIPT entries produced by write_script.
+            max_concurrency (int): Maximum number of LLM calls in flight at once.
+
+        Returns:
+            list: The written posts, in script order, as dicts with USER, TIME and POST keys.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        users_by_name = {user["USERNAME"]: user for user in users}
+        written_posts = []
+
+        async def draft_post(index: int, post: dict, previous_posts: list) -> tuple:
+            async with semaphore:
+                draft = await actor.adraft_action(
+                    social_network_data, post["USER"], users_by_name, previous_posts, post["PURPOSE"], post["FEATURES"]
+                )
+            return index, draft
+
+        async def review_post(draft: tuple) -> dict:
+            async with semaphore:
+                return await actor.areview_action(*draft)
+
+        for block in self.plan_batches(script):
+            previous_posts = list(written_posts)
+            drafts = [asyncio.create_task(draft_post(index, post, previous_posts)) for index, post in enumerate(block)]
+
+            pending_judgements = {}
+            for finished in asyncio.as_completed(drafts):
+                index, draft = await finished
+                pending_judgements[index] = asyncio.create_task(review_post(draft))
+
+            for index, post in enumerate(block):
+                response = await pending_judgements[index]
+                if not has_post(response):
+                    logger.warning("Skipping post by '%s' at %s, which never produced a usable response.", post["USER"], post["TIME"])
+                    continue
+                written_posts.append({"USER": post["USER"], "TIME": post["TIME"], "POST": response["POST"]})
+
+        return written_posts
+
+    def _recent_posts(self, script: list) -> str:
+        """
+        Format the end of a script for a continuation prompt, keeping as many of the last POSTS_PER_CALL
+        posts as fit in CONTINUATION_CONTEXT_TOKENS.
+
+        Args:
+            script (list): The SCRIPT entries written so far.
+
+        Returns:
+            str: One line per post, oldest first.
+        """
+        lines = [_post_line(post) for post in script[-POSTS_PER_CALL:]]
+        return "\n".join(keep_newest_within(lines, CONTINUATION_CONTEXT_TOKENS, self.llm))
+
+    def _token_budget(self, number_of_users: int, number_of_posts: int, with_content: bool) -> int:
+        """
+        Token budget for a script response: the estimate for the script, but never below the model's default.
+
+        Args:
+            number_of_users (int): USERS entries in the response.
+            number_of_posts (int): SCRIPT entries in the response.
+            with_content (bool): Whether every SCRIPT entry carries the text of its post.
+
+        Returns:
+            int: The max_new_tokens to ask for.
+        """
+        return max(self.llm.max_new_tokens, _script_token_budget(number_of_users, number_of_posts, with_content))
+
+    @staticmethod
+    def _validated(model: Type[BaseModel], response) -> dict:
+        """
+        Check a response against the schema it was requested with.
+
+        Args:
+            model (Type[BaseModel]): The Pydantic model generated from the schema.
+            response: The parsed response, or the raw text if it couldn't be parsed.
+
+        Returns:
+            dict: The response, limited to the schema's fields.
+
+        Raises:
+            pydantic.ValidationError: If the response is missing fields, has the wrong types, or isn't JSON.
+        """
+        return model.model_validate(response).model_dump()
+
+    @staticmethod
+    def plan_batches(script: list) -> list:
+        """
+        Split a script into consecutive blocks in which no user posts more than once.
+
+        Posts in a block don't depend on each other, so they can be written together from the history
+        before the block, e.g. with Actor.perform_actions_batch.
+
+        Args:
+            script (list): The SCRIPT entries produced by write_script.
+
+        Returns:
+            list: A list of blocks, each a list of script entries.
+        """
+        blocks = []
+        block = []
+        block_users = set()
+        for post in script:
+            if post["USER"] in block_users:
+                blocks.append(block)
+                block = []
+                block_users = set()
+            block.append(post)
+            block_users.add(post["USER"])
+        if block:
+            blocks.append(block)
+        return blocks
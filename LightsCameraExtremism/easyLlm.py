@@ -1,32 +1,63 @@
 import re
-from typing import Any, Dict, List, Tuple, Type, Union
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type, Union
 
 import torch
 from transformers import (
     AutoModelForCausalLM,
     AutoTokenizer,
     BitsAndBytesConfig,
+    TextIteratorStreamer,
     logging as hf_logging,
 )
-from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.prompts import PromptTemplate
 from pydantic import BaseModel, Field, RootModel, create_model
 import json
+import logging
 import os
+import queue
 import random
 import functools
-import einops
-import gc
-from transformer_lens import HookedTransformer, utils 
-from transformer_lens.hook_points import HookPoint
-from jaxtyping import Float
-from collections import defaultdict
+import asyncio
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import weakref
+
+from LightsCameraExtremism.cache import ResponseCache
+from LightsCameraExtremism.parsing import json_dumps as _json_dumps, json_loads as _json_loads, try_parse
 
 # Suppress unnecessary warnings
 hf_logging.set_verbosity_error()
 
+logger = logging.getLogger(__name__)
+
 UNSLOTH_MODELS = ["unsloth/Mistral-Small-Instruct-2409-bnb-4bit"]
 
+# Models and tokenizers already in memory, keyed by model name (and quantization and compilation, for
+# models), so every EasyLLM (and every Agent built on one) using the same model shares a single copy.
+# Entries disappear once no EasyLLM holds them.
+_LOADED_MODELS: "weakref.WeakValueDictionary[Tuple[str, str, bool], AutoModelForCausalLM]" = weakref.WeakValueDictionary()
+_LOADED_TOKENIZERS: "weakref.WeakValueDictionary[str, AutoTokenizer]" = weakref.WeakValueDictionary()
+_LOAD_LOCK = threading.Lock()
+
+# Matches the role names a chat template compares messages against
+_ROLE_RE = re.compile(r'message\["role"\]\s*==\s*"([^"]+)"')
+
+_JSON_PROMPT_TEMPLATE = "Answer the following query in JSON format according to the provided schema:\n{format_instructions}\n\n"
+# Format-instruction prefixes for generate_json_prompt, keyed by Pydantic model class
+_JSON_PROMPT_PREFIXES: Dict[Type[BaseModel], str] = {}
+
+# Weight quantizations EasyLLM can load a model with
+QUANTIZATIONS = ("none", "int8", "int4")
+
+# Responses sampled above this temperature are too varied to be worth caching
+MAX_CACHED_TEMPERATURE = 0.3
+
+# Prompts are left padded to a multiple of this many tokens so matmul shapes stay tensor-core aligned
+PAD_TO_MULTIPLE_OF = 8
+
+# Seconds stream_question waits for the next chunk of text before giving up on the generation
+STREAM_TIMEOUT = 120
+
 class EasyLLM:
     """
     A simple class for interacting with a pretrained language model to generate dialogue responses.
@@ -34,8 +65,12 @@ class EasyLLM:
 
     def __init__(
         self,
-        max_new_tokens: int = 100000,
+        max_new_tokens: int = 1024,
         model_name: str = None,
+        temperature: float = None,
+        cache_path: str = None,
+        compile_model: bool = False,
+        quantization: str = None,
     ) -> None:
         """
         Initializes the EasyLLM class with a specified model and token generation limit.
@@ -43,14 +78,32 @@ class EasyLLM:
         Args:
             max_new_tokens (int): Maximum number of new tokens to generate in a response.
             model_name (str): Name of the pretrained language model to use.
+            temperature (float): Sampling temperature, or None to use the model's default.
+            cache_path (str): Path of an on-disk response cache. Responses are only cached when a temperature
+                of at most MAX_CACHED_TEMPERATURE is set.
+            compile_model (bool): Whether to torch.compile the model's forward pass and generate with a static
+                KV cache, trading a slow first call for less per-token overhead afterwards.
+            quantization (str): How to quantize the weights with bitsandbytes, one of QUANTIZATIONS. Int8 and
+                int4 halve and quarter the weight memory read per decoded token. None picks int4 or int8 when
+                the model name says it is a 4bit or 8bit checkpoint, and no quantization otherwise.
         """
+        if quantization is not None and quantization not in QUANTIZATIONS:
+            raise ValueError(f"quantization must be one of {QUANTIZATIONS}, not {quantization!r}")
+
         self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.compile_model = compile_model
+        self.response_cache = ResponseCache(cache_path) if cache_path else None
         
         if model_name is None:
             model_name = random.choice(UNSLOTH_MODELS)
             print(f"No model chosen, model {model_name} selected.")
         
         self.model_name = model_name
+        if quantization is None:
+            lowered = model_name.lower()
+            quantization = "int4" if '4bit' in lowered else "int8" if '8bit' in lowered else "none"
+        self.quantization = quantization
         self.dialogue: List[dict] = []
 
         self._device: str = "cuda"
@@ -61,6 +114,11 @@ class EasyLLM:
         self.refusal_dir = None
         self.ablation_hooks = []
 
+        # Serialises access to the model and dialogue history when called from several threads
+        self._lock = threading.RLock()
+        # Shared worker threads for the async API, so concurrent callers don't each start their own
+        self._pool = ThreadPoolExecutor(max_workers=(os.cpu_count() or 1) * 2)
+
     def _load_model(self) -> Tuple[AutoModelForCausalLM, AutoTokenizer]:
         """
         Loads the pretrained language model and tokenizer only when needed.
@@ -68,54 +126,115 @@ class EasyLLM:
         Returns:
             Tuple[AutoModelForCausalLM, AutoTokenizer]: Loaded language model and tokenizer.
         """
-        if self.model is None or self.tokenizer is None:
-            is_4bit = '4bit' in self.model_name.lower()
-            is_8bit = '8bit' in self.model_name.lower()
-
-            if is_4bit or is_8bit:
-                # Use BitsAndBytesConfig for quantized models
-                if is_4bit:
-                    quantization_config = BitsAndBytesConfig(
-                        load_in_4bit=True,
-                        bnb_4bit_compute_dtype=torch.bfloat16,
-                        bnb_4bit_use_double_quant=True,
-                        bnb_4bit_quant_type='nf4',
-                    )
-                else:
-                    quantization_config = BitsAndBytesConfig(
-                        load_in_8bit=True,
-                        bnb_8bit_compute_dtype=torch.bfloat16,
-                    )
+        if self.model is not None and self.tokenizer is not None:
+            return self.model, self.tokenizer
+
+        with _LOAD_LOCK:
+            self.model = _LOADED_MODELS.get(self._registry_key())
+            self.tokenizer = _LOADED_TOKENIZERS.get(self.model_name)
+            if self.model is None or self.tokenizer is None:
+                self._load_pretrained()
+                if self.compile_model:
+                    self.model.forward = torch.compile(self.model.forward, mode="reduce-overhead")
+                _LOADED_MODELS[self._registry_key()] = self.model
+                _LOADED_TOKENIZERS[self.model_name] = self.tokenizer
 
-                # Use device_map with max_memory to control layer placement
-                device_map = "auto"
+        return self.model, self.tokenizer
 
-                self.model = AutoModelForCausalLM.from_pretrained(
-                    self.model_name,
-                    quantization_config=quantization_config,
-                    device_map=device_map,
-                    offload_folder="offload",  # Folder to offload weights if necessary
+    def _load_private_model(self) -> None:
+        """
+        Replaces this instance's model with a freshly loaded copy that isn't in the shared registry, for
+        changes (like abliteration) that must not reach other EasyLLMs using the same model.
+        """
+        with _LOAD_LOCK:
+            # Drop the shared model first, so the two aren't both held while the copy loads
+            self.model = None
+            self._load_pretrained()
+            if self.compile_model:
+                self.model.forward = torch.compile(self.model.forward, mode="reduce-overhead")
+
+    def _registry_key(self) -> Tuple[str, str, bool]:
+        """
+        Key of this instance's model in the shared model registry.
+
+        A compiled model only works with the static KV cache _generate asks for when compiling, and an
+        uncompiled one shouldn't be given it, so compilation is part of the key.
+
+        Returns:
+            Tuple[str, str, bool]: The model name, quantization and whether the model is compiled.
+        """
+        return (self.model_name, self.quantization, self.compile_model)
+
+    def _load_pretrained(self) -> None:
+        """
+        Reads the pretrained language model and tokenizer from disk or the hub.
+        """
+        is_4bit = self.quantization == "int4"
+        is_8bit = self.quantization == "int8"
+
+        if is_4bit or is_8bit:
+            # Use BitsAndBytesConfig for quantized models
+            if is_4bit:
+                quantization_config = BitsAndBytesConfig(
+                    load_in_4bit=True,
+                    bnb_4bit_compute_dtype=torch.bfloat16,
+                    bnb_4bit_use_double_quant=True,
+                    bnb_4bit_quant_type='nf4',
                 )
             else:
-                # For non-quantized models
-                self.model = AutoModelForCausalLM.from_pretrained(
-                    self.model_name,
-                    torch_dtype=torch.bfloat16,
-                    device_map='auto',
+                quantization_config = BitsAndBytesConfig(
+                    load_in_8bit=True,
+                    bnb_8bit_compute_dtype=torch.bfloat16,
                 )
 
-            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name, padding_side="left")
+            # Use device_map with max_memory to control layer placement
+            device_map = "auto"
 
-            # Ensure pad_token_id is set
-            if self.tokenizer.pad_token_id is None:
-                self.tokenizer.pad_token_id = self.tokenizer.eos_token_id or 0
+            self.model = AutoModelForCausalLM.from_pretrained(
+                self.model_name,
+                quantization_config=quantization_config,
+                torch_dtype=torch.bfloat16,
+                device_map=device_map,
+                offload_folder="offload",  # Folder to offload weights if necessary
+                low_cpu_mem_usage=True,
+            )
+        else:
+            # For non-quantized models
+            self.model = AutoModelForCausalLM.from_pretrained(
+                self.model_name,
+                torch_dtype=torch.bfloat16,
+                device_map='auto',
+                low_cpu_mem_usage=True,
+            )
 
-        return self.model, self.tokenizer
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name, padding_side="left")
+
+        # Ensure pad_token_id is set
+        if self.tokenizer.pad_token_id is None:
+            self.tokenizer.pad_token_id = self.tokenizer.eos_token_id or 0
+
+    def close(self) -> None:
+        """
+        Releases this instance's model, tokenizer and worker threads. The GPU memory is freed once no
+        other EasyLLM using the same model still holds it.
+
+        The instance can still be used afterwards, reloading the model when it is next needed.
+        """
+        # Outside the lock, since the async calls still running need it to finish
+        self._pool.shutdown(wait=True)
+        # Executors start their threads on first use, so the replacement costs nothing until then
+        self._pool = ThreadPoolExecutor(max_workers=(os.cpu_count() or 1) * 2)
+
+        with self._lock:
+            self._unload_model()
 
     def _unload_model(self) -> None:
         """
         Unloads the model from GPU memory by deleting the model and tokenizer.
         """
+        # The hooks hold the model's modules, and would otherwise keep it alive
+        self.ablation_hooks = []
+
         if self.model is not None:
             del self.model
             self.model = None
@@ -125,68 +244,197 @@ class EasyLLM:
             del self.tokenizer
             self.tokenizer = None
 
-    def _generate_dialogue_response(self, messages: List[dict]) -> str:
+    def _generate_dialogue_response(self, messages: List[dict], max_new_tokens: int = None) -> str:
         """
         Generates a response from the language model based on the input messages.
 
         Args:
             messages (List[dict]): List of input messages.
+            max_new_tokens (int): Token limit for this response, or None for the instance's max_new_tokens.
 
         Returns:
             str: Generated response from the language model.
         """
         # Load model and tokenizer if not already loaded
         self._load_model()
-        
+
+        input_ids, attention_mask = self._encode_messages(messages)
+
+        generated_ids = self._generate(input_ids, attention_mask, max_new_tokens=max_new_tokens)
+
+        # Extract only the newly generated tokens
+        generated_tokens = generated_ids[:, input_ids.shape[-1]:]
+        decoded = self.tokenizer.batch_decode(generated_tokens, skip_special_tokens=True)[0]
+
+        return decoded.strip()
+
+    def _encode_messages(self, messages: List[dict]) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Tokenizes a conversation for generation, on the model's device.
+
+        Args:
+            messages (List[dict]): List of input messages.
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor]: The input ids and attention mask.
+        """
         chat_template = getattr(self.tokenizer, 'chat_template', None)
         if (chat_template):
-            # Use the chat template to prepare input
-            input_data = self.tokenizer.apply_chat_template(
-                messages, tokenize=True, add_generation_prompt=True, return_tensors="pt"
-            )
-            # Check if input_data is a dictionary or tensor
-            if isinstance(input_data, dict):
-                input_ids = input_data["input_ids"].to(self._device)
-                attention_mask = input_data.get("attention_mask", torch.ones_like(input_ids)).to(self._device)
-            elif isinstance(input_data, torch.Tensor):
-                # input_data is a tensor
-                input_ids = input_data.to(self._device)
-                attention_mask = torch.ones_like(input_ids).to(self._device)
-            else:
-                raise TypeError(f"Unexpected type for input_data: {type(input_data)}")
+            # Use the chat template to prepare input, taking the attention mask from the tokenizer too
+            input_data = self._pad_inputs(self.tokenizer.apply_chat_template(
+                messages, tokenize=True, add_generation_prompt=True, return_dict=True, return_tensors="pt"
+            ))
         else:
             # Manually format the prompt without assuming roles
             prompt = self.format_messages(messages)
-            input_ids = self.tokenizer.encode(prompt, return_tensors="pt").to(self._device)
-            attention_mask = torch.ones_like(input_ids).to(self._device)
+            input_data = self.tokenizer(
+                prompt, padding=True, pad_to_multiple_of=PAD_TO_MULTIPLE_OF, return_tensors="pt"
+            )
+
+        input_ids = input_data["input_ids"].to(self._device, non_blocking=True)
+        attention_mask = input_data.get("attention_mask")
+        if attention_mask is None:
+            # Built straight on the target device rather than copied there
+            attention_mask = torch.ones_like(input_ids)
+        else:
+            attention_mask = attention_mask.to(self._device, non_blocking=True)
+
+        return input_ids, attention_mask
+
+    def tokenize_batch(self, texts: List[str]) -> List[List[int]]:
+        """
+        Tokenizes several texts in a single tokenizer call.
+
+        Args:
+            texts (List[str]): The texts to tokenize.
+
+        Returns:
+            List[List[int]]: The token ids of each text, without padding or special tokens.
+        """
+        if self.tokenizer is None:
+            with self._lock:
+                self._load_model()
+
+        return self.tokenizer(texts, padding=False, add_special_tokens=False)["input_ids"]
+
+    def count_tokens(self, texts: Union[str, List[str]]) -> Union[int, List[int]]:
+        """
+        Counts the tokens in a text, or in each of several texts with one batched tokenizer call.
+
+        Args:
+            texts (Union[str, List[str]]): The text or texts to count.
+
+        Returns:
+            Union[int, List[int]]: The number of tokens in the text, or in each text.
+        """
+        if isinstance(texts, str):
+            return len(self.tokenize_batch([texts])[0])
+        return [len(token_ids) for token_ids in self.tokenize_batch(texts)]
+
+    def _pad_inputs(self, input_data):
+        """
+        Left pads tokenized prompts to a multiple of PAD_TO_MULTIPLE_OF tokens.
+
+        Args:
+            input_data (BatchEncoding): The tokenizer output, with input_ids and attention_mask.
+
+        Returns:
+            BatchEncoding: The padded input_ids and attention_mask.
+        """
+        return self.tokenizer.pad(input_data, pad_to_multiple_of=PAD_TO_MULTIPLE_OF, return_tensors="pt")
+
+    def _generate(
+        self,
+        input_ids: torch.Tensor,
+        attention_mask: torch.Tensor,
+        streamer: Optional[TextIteratorStreamer] = None,
+        max_new_tokens: int = None,
+    ) -> torch.Tensor:
+        """
+        Runs model.generate with the configured sampling settings and any ablation hooks.
+
+        Args:
+            input_ids (torch.Tensor): Token ids of the (left padded) prompts.
+            attention_mask (torch.Tensor): Attention mask matching input_ids.
+            streamer (Optional[TextIteratorStreamer]): Receives the generated text as it is produced.
+            max_new_tokens (int): Token limit for this call, or None for the instance's max_new_tokens.
+
+        Returns:
+            torch.Tensor: The prompt ids followed by the generated ids.
+        """
+        if self.temperature == 0:
+            # Sampling at temperature 0 is rejected by generate; greedy decoding is what it means
+            generation_kwargs = {"do_sample": False}
+        elif self.temperature is None:
+            generation_kwargs = {"do_sample": True}
+        else:
+            generation_kwargs = {"do_sample": True, "temperature": self.temperature}
+        if streamer is not None:
+            generation_kwargs["streamer"] = streamer
+        if max_new_tokens is None:
+            max_new_tokens = self.max_new_tokens
+        if self.compile_model:
+            # A compiled forward pass needs fixed-shape cache tensors to avoid recompiling every step
+            generation_kwargs["cache_implementation"] = "static"
 
         # Apply ablation hooks during generation
-        if self.ablation_hooks:
-            with self.model.hooks(fwd_hooks=self.ablation_hooks):
+        with torch.inference_mode():
+            if self.ablation_hooks:
+                with self._ablation_hooks_applied():
+                    generated_ids = self.model.generate(
+                        input_ids=input_ids,
+                        attention_mask=attention_mask,
+                        max_new_tokens=max_new_tokens,
+                        use_cache=True,
+                        pad_token_id=self.tokenizer.pad_token_id,
+                        **generation_kwargs,
+                    )
+            else:
                 generated_ids = self.model.generate(
                     input_ids=input_ids,
                     attention_mask=attention_mask,
-                    max_new_tokens=self.max_new_tokens,
-                    do_sample=True,
-                    pad_token_id=self.tokenizer.pad_token_id 
+                    max_new_tokens=max_new_tokens,
+                    use_cache=True,
+                    pad_token_id=self.tokenizer.pad_token_id,
+                    **generation_kwargs,
                 )
+
+        return generated_ids
+
+    def _generate_dialogue_responses(self, conversations: List[List[dict]]) -> List[str]:
+        """
+        Generates responses for several conversations with a single batched model.generate call.
+
+        Args:
+            conversations (List[List[dict]]): One list of input messages per response.
+
+        Returns:
+            List[str]: Generated responses, in the same order as the conversations.
+        """
+        # Load model and tokenizer if not already loaded
+        self._load_model()
+
+        chat_template = getattr(self.tokenizer, 'chat_template', None)
+        if chat_template:
+            input_data = self._pad_inputs(self.tokenizer.apply_chat_template(
+                conversations, tokenize=True, add_generation_prompt=True, padding=True, return_dict=True, return_tensors="pt"
+            ))
         else:
-            generated_ids = self.model.generate(
-                input_ids=input_ids,
-                attention_mask=attention_mask,
-                max_new_tokens=self.max_new_tokens,
-                do_sample=True,
-                pad_token_id=self.tokenizer.pad_token_id,
+            prompts = [self.format_messages(messages) for messages in conversations]
+            input_data = self.tokenizer(
+                prompts, padding=True, pad_to_multiple_of=PAD_TO_MULTIPLE_OF, return_tensors="pt"
             )
 
-        # Extract only the newly generated tokens
-        generated_tokens = generated_ids[:, input_ids.shape[-1]:]
-        decoded = self.tokenizer.batch_decode(generated_tokens, skip_special_tokens=True)[0]
+        # The tokenizer pads on the left, so every prompt ends where generation starts
+        input_ids = input_data["input_ids"].to(self._device, non_blocking=True)
+        attention_mask = input_data["attention_mask"].to(self._device, non_blocking=True)
 
-        # Unload model after generation to free up GPU memory
-        self._unload_model()
+        generated_ids = self._generate(input_ids, attention_mask)
 
-        return decoded.strip()
+        generated_tokens = generated_ids[:, input_ids.shape[-1]:]
+        decoded = self.tokenizer.batch_decode(generated_tokens, skip_special_tokens=True)
+
+        return [response.strip() for response in decoded]
 
     def reset_dialogue(self) -> None:
         """
@@ -194,20 +442,153 @@ class EasyLLM:
         """
         self.dialogue = []
 
-    def ask_question(self, question: str, reset_dialogue: bool = True, attempts=0) -> str:
+    def ask_question(
+        self,
+        question: str,
+        reset_dialogue: bool = True,
+        attempts=0,
+        system_prompt: str = None,
+        max_new_tokens: int = None,
+    ) -> str:
         """
-        Generates a response for the given question using the loaded model.
+        Generates a response for the given question using the loaded model. Safe to call from several threads.
 
         Args:
             question (str): The question or prompt provided by the user.
             reset_dialogue (bool): Whether to reset the dialogue history after generating a response.
+            system_prompt (str): Optional static instructions sent ahead of the dialogue.
+            max_new_tokens (int): Token limit for this response, or None for the instance's max_new_tokens.
+                Long structured answers, like a whole script, need more than the default.
 
         Returns:
             str: Generated response to the question.
         """
-        if reset_dialogue:
-            self.reset_dialogue()
+        use_cache = (
+            self.response_cache is not None
+            and reset_dialogue
+            and self.temperature is not None
+            and self.temperature <= MAX_CACHED_TEMPERATURE
+        )
+        if use_cache:
+            key = ResponseCache.make_key(
+                self.model_name,
+                self.quantization,
+                bool(self.ablation_hooks),
+                system_prompt,
+                question,
+                self.temperature,
+                max_new_tokens or self.max_new_tokens,
+            )
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                return cached
+
+        with self._lock:
+            result = self._ask_question(question, reset_dialogue, attempts, system_prompt, max_new_tokens)
+
+        # A string result is raw text that failed to parse, which isn't worth keeping
+        if use_cache and result is not None and not isinstance(result, str):
+            self.response_cache.set(key, result)
 
+        return result
+
+    async def aask_question(self, question: str, reset_dialogue: bool = True, system_prompt: str = None) -> str:
+        """
+        Asynchronous variant of ask_question, running generation off the event loop.
+
+        Args:
+            question (str): The question or prompt provided by the user.
+            reset_dialogue (bool): Whether to reset the dialogue history after generating a response.
+            system_prompt (str): Optional static instructions sent ahead of the dialogue.
+
+        Returns:
+            str: Generated response to the question.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._pool, functools.partial(self.ask_question, question, reset_dialogue, 0, system_prompt)
+        )
+
+    def stream_question(self, question: str, system_prompt: str = None) -> Iterator[str]:
+        """
+        Generates a response for the given question, yielding the text as it is produced.
+
+        The streamed text is not parsed as JSON, and the model is held by this call until the iterator is
+        exhausted. The dialogue history is not used or changed.
+
+        Args:
+            question (str): The question or prompt provided by the user.
+            system_prompt (str): Optional static instructions sent ahead of the question.
+
+        Yields:
+            str: Chunks of the generated response.
+
+        Raises:
+            TimeoutError: If no text arrives for STREAM_TIMEOUT seconds.
+            Exception: Whatever generation raised, re-raised here once the stream has ended.
+        """
+        with self._lock:
+            self._load_model()
+
+            chat_template = getattr(self.tokenizer, 'chat_template', None)
+            roles = self.extract_roles_from_template(chat_template) if chat_template else []
+            message_roles = self.get_message_roles(roles)
+
+            messages = [{"role": message_roles['user'], "content": question}]
+            if system_prompt:
+                messages = self._add_system_prompt(messages, system_prompt, chat_template, roles, message_roles)
+
+            input_ids, attention_mask = self._encode_messages(messages)
+
+            # generate blocks until it finishes, so it runs on its own thread while the streamer is read here
+            streamer = TextIteratorStreamer(
+                self.tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=STREAM_TIMEOUT
+            )
+            errors = []
+
+            def run_generation() -> None:
+                try:
+                    self._generate(input_ids, attention_mask, streamer)
+                except Exception as error:
+                    errors.append(error)
+                    # Ends the stream, which would otherwise wait for text that is never coming
+                    streamer.end()
+
+            generation = threading.Thread(target=run_generation)
+            generation.start()
+            try:
+                yield from streamer
+            except queue.Empty:
+                generation.join()
+                if not errors:
+                    raise TimeoutError(f"No text was generated for {STREAM_TIMEOUT} seconds") from None
+            finally:
+                generation.join()
+
+            if errors:
+                raise errors[0]
+
+    def _ask_question(
+        self,
+        question: str,
+        reset_dialogue: bool = True,
+        attempts=0,
+        system_prompt: str = None,
+        max_new_tokens: int = None,
+    ) -> str:
+        """
+        Generates a response for the given question using the loaded model.
+
+        Args:
+            question (str): The question or prompt provided by the user.
+            reset_dialogue (bool): Whether to reset the dialogue history after generating a response.
+            system_prompt (str): Optional static instructions sent ahead of the dialogue. Keeping these
+                byte-identical across calls lets the prompt prefix be reused between requests.
+            max_new_tokens (int): Token limit for this response, or None for the instance's max_new_tokens.
+
+        Returns:
+            str: Generated response to the question, parsed from JSON when possible and otherwise the raw text.
+        """
         # Load model and tokenizer if not already loaded
         self._load_model()
 
@@ -220,52 +601,109 @@ class EasyLLM:
 
         # Add the user's question with the appropriate role
         if message_roles['user']:
-            self.dialogue.append({"role": message_roles['user'], "content": question})
+            user_message = {"role": message_roles['user'], "content": question}
         else:
-            self.dialogue.append({"content": question})
+            user_message = {"content": question}
 
-        # Prepare the messages for the model
-        messages_for_model = self.dialogue.copy()
+        if reset_dialogue:
+            # The history would be cleared straight after, so send the question on its own
+            self.reset_dialogue()
+            messages_for_model = [user_message]
+        else:
+            # Generation finishes before the history is extended, so it can be sent without a copy
+            self.dialogue.append(user_message)
+            messages_for_model = self.dialogue
+
+        if system_prompt:
+            messages_for_model = self._add_system_prompt(messages_for_model, system_prompt, chat_template, roles, message_roles)
 
         # Generate the response
-        result = self._generate_dialogue_response(messages_for_model)
+        result = self._generate_dialogue_response(messages_for_model, max_new_tokens)
 
         # Add the model's response to the dialogue history
-        if message_roles['assistant']:
-            self.dialogue.append({"role": message_roles['assistant'], "content": result})
-        else:
-            self.dialogue.append({"content": result})
+        if not reset_dialogue:
+            if message_roles['assistant']:
+                self.dialogue.append({"role": message_roles['assistant'], "content": result})
+            else:
+                self.dialogue.append({"content": result})
 
-        # Optionally reset the dialogue
-        if reset_dialogue:
-            self.reset_dialogue()
+        parsed = self._try_parse(result)
+        if parsed is None:
+            # Nothing parseable, so regenerate once; after that hand back the raw text rather than losing it
+            if attempts < 1:
+                return self._ask_question(question, reset_dialogue, 1, system_prompt, max_new_tokens)
+            return result
+        return parsed
 
+    def ask_questions(self, questions: List[str], system_prompt: str = None) -> List[Any]:
+        """
+        Generates responses for several independent questions with one batched generation, so the
+        model weights are read once per decoding step for the whole batch rather than once per question.
+
+        Args:
+            questions (List[str]): The questions or prompts, each answered without dialogue history.
+            system_prompt (str): Optional static instructions sent ahead of every question.
+
+        Returns:
+            List[Any]: The parsed response to each question, in order.
+        """
+        with self._lock:
+            self._load_model()
+
+            chat_template = getattr(self.tokenizer, 'chat_template', None)
+            roles = self.extract_roles_from_template(chat_template) if chat_template else []
+            message_roles = self.get_message_roles(roles)
+
+            conversations = []
+            for question in questions:
+                messages = [{"role": message_roles['user'], "content": question}]
+                if system_prompt:
+                    messages = self._add_system_prompt(messages, system_prompt, chat_template, roles, message_roles)
+                conversations.append(messages)
+
+            results = self._generate_dialogue_responses(conversations)
+
+            responses = []
+            for question, result in zip(questions, results):
+                parsed = self._try_parse(result)
+                if parsed is None:
+                    # Regenerate just the answer that couldn't be parsed, as ask_question would
+                    parsed = self._ask_question(question, True, 1, system_prompt)
+                responses.append(parsed)
+
+            return responses
+
+    @staticmethod
+    def _add_system_prompt(
+        messages: List[dict], system_prompt: str, chat_template: str, roles: List[str], message_roles: Dict[str, str]
+    ) -> List[dict]:
+        """
+        Puts the system prompt ahead of the messages, as a system message when the chat template supports one.
+
+        Args:
+            messages (List[dict]): The messages to send.
+            system_prompt (str): The static instructions.
+            chat_template (str): The tokenizer's chat template, if any.
+            roles (List[str]): Roles extracted from the chat template.
+            message_roles (Dict[str, str]): The user and assistant roles in use.
+
+        Returns:
+            List[dict]: The messages with the system prompt added.
+        """
+        if not chat_template or ('system' in roles and message_roles['assistant'] != 'system'):
+            return [{"role": "system", "content": system_prompt}] + messages
+
+        # Template has no system role, so keep the static text as the leading part of the first message
+        first = messages[0]
+        return [{**first, "content": f"{system_prompt}\n\n{first['content']}"}] + messages[1:]
+
+    @staticmethod
+    def _try_parse(raw: str) -> Optional[Any]:
+        """
+        Extracts and parses the JSON object in a model response. See parsing.try_parse.
+        """
+        return try_parse(raw)
 
-        result = result.replace("json","")
-        result = result.replace("\n"," ").replace("   ","  ").replace("  "," ")
-        try:
-            return json.loads(result)
-        except:
-            try:
-                return self.parse_llm_json(result)
-            except:
-                preamble, *resp = result.split(":")
-                resp = "".join(resp)
-                try:
-                    return json.loads(resp)
-                except:
-                    result = result.split('``` ', 1)[-1]
-                    result = result.replace("```","")
-                    try:
-                        return json.loads(result)
-                    except:
-                        try:
-                            result = result.split(': ', 1)[-1]
-                            return json.loads(result)
-                        except:
-                            if attempts < 1:
-                                return self.ask_question(question, reset_dialogue, 1)
-            
     def extract_roles_from_template(self, chat_template: str) -> List[str]:
         """
         Extracts roles used in the chat template.
@@ -277,8 +715,7 @@ class EasyLLM:
             List[str]: A list of roles extracted from the template.
         """
         # Use regex to find roles in the chat template
-        roles = re.findall(r'message\["role"\]\s*==\s*"([^"]+)"', chat_template)
-        return list(set(roles))
+        return list(set(_ROLE_RE.findall(chat_template)))
 
     def get_message_roles(self, roles: List[str]) -> Dict[str, str]:
         """
@@ -287,6 +724,22 @@ class EasyLLM:
         Args:
             roles (List[str]): List of roles extracted from the chat template.
 
+        Returns:
+            Dict[str, str]: A dictionary with keys 'user' and 'assistant' mapping to the appropriate roles.
+        """
+        # Roles are fixed per tokenizer, so resolve each set once. Sorting makes the result independent
+        # of set ordering, and the copy keeps callers from mutating the cached dict.
+        return dict(self._resolve_message_roles(tuple(sorted(roles))))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def _resolve_message_roles(roles: Tuple[str, ...]) -> Dict[str, str]:
+        """
+        Applies the role assignment heuristic for get_message_roles.
+
+        Args:
+            roles (Tuple[str, ...]): Sorted roles extracted from the chat template.
+
         Returns:
             Dict[str, str]: A dictionary with keys 'user' and 'assistant' mapping to the appropriate roles.
         """
@@ -336,15 +789,11 @@ class EasyLLM:
         Returns:
             str: The formatted prompt.
         """
-        formatted = ""
-        for message in messages:
-            content = message["content"]
-            role = message.get("role")
-            if role:
-                formatted += f"{role}: {content}\n"
-            else:
-                formatted += f"{content}\n"
-        return formatted.strip()
+        parts = [
+            f"{message['role']}: {message['content']}" if message.get("role") else message["content"]
+            for message in messages
+        ]
+        return "\n".join(parts).strip()
 
     def parse_llm_json(self, llm_response):
         """
@@ -364,7 +813,7 @@ class EasyLLM:
         if match:
             json_str = match.group(1).strip()
             try:
-                data = json.loads(json_str)
+                data = _json_loads(json_str)
                 return data
             except json.JSONDecodeError as e:
                 raise Exception(f"Failed to decode JSON: {e}")
@@ -386,18 +835,17 @@ class EasyLLM:
         if not isinstance(schema, type) or not issubclass(schema, BaseModel):
             raise TypeError("The schema argument must be a Pydantic model class.")
 
-        # Initialize the JSON output parser with your schema
-        parser = JsonOutputParser(pydantic_object=schema)
+        # The format instructions only depend on the schema, so build the prompt prefix once per model
+        prefix = _JSON_PROMPT_PREFIXES.get(schema)
+        if prefix is None:
+            # Imported here since langchain is slow to import and only needed once per schema
+            from langchain_core.output_parsers import JsonOutputParser
 
-        # Create a prompt template with the format instructions injected
-        prompt = PromptTemplate(
-            template="Answer the following query in JSON format according to the provided schema:\n{format_instructions}\n\n{query}\n",
-            input_variables=["query"],
-            partial_variables={"format_instructions": parser.get_format_instructions()},
-        )
+            parser = JsonOutputParser(pydantic_object=schema)
+            prefix = _JSON_PROMPT_TEMPLATE.format(format_instructions=parser.get_format_instructions())
+            _JSON_PROMPT_PREFIXES[schema] = prefix
 
-        # Generate the response using the model and parser
-        response = prompt.format(query=query)
+        response = f"{prefix}{query}\n"
 
         return response
 
@@ -443,8 +891,27 @@ class EasyLLM:
             Type[BaseModel]: The generated Pydantic model class.
         """
         if isinstance(json_schema, str):
-            json_schema = json.loads(json_schema)
+            return EasyLLM._build_model(schema_name, json_schema)
+
+        if isinstance(json_schema, (dict, list)):
+            # Dicts and lists aren't hashable, so key the cache on their JSON text. Keys are not sorted,
+            # since field order is part of the generated model and its format instructions.
+            return EasyLLM._build_model(schema_name, _json_dumps(json_schema))
 
+        raise ValueError("The provided JSON schema must be a dictionary, list, or valid JSON string.")
+
+    @staticmethod
+    def _create_model(schema_name: str, json_schema: Union[Dict[str, Any], List[Any]]) -> Type[BaseModel]:
+        """
+        Creates a Pydantic model from a parsed JSON schema.
+
+        Args:
+            schema_name (str): The name of the Pydantic model to create.
+            json_schema (Union[Dict[str, Any], List[Any]]): The JSON schema as a dictionary or list.
+
+        Returns:
+            Type[BaseModel]: The generated Pydantic model class.
+        """
         if isinstance(json_schema, dict):
             fields = {
                 field_name: EasyLLM.parse_field(field_name, field_value)
@@ -462,156 +929,241 @@ class EasyLLM:
         else:
             raise ValueError("The provided JSON schema must be a dictionary, list, or valid JSON string.")
 
+    @staticmethod
+    @functools.lru_cache(maxsize=128)
+    def _build_model(schema_name: str, schema_json: str) -> Type[BaseModel]:
+        """
+        Builds the Pydantic model for a JSON schema string, caching it so each schema is only compiled once.
+        Model classes are not modified after creation, so sharing them between callers is safe.
+
+        Args:
+            schema_name (str): The name of the Pydantic model to create.
+            schema_json (str): The JSON schema as a string.
+
+        Returns:
+            Type[BaseModel]: The generated Pydantic model class.
+        """
+        return EasyLLM._create_model(schema_name, _json_loads(schema_json))
+
     def setup_abliteration(self):
         """Sets up abliteration to remove content filtering"""
-        # Convert to HookedTransformer
-        hooked_model = HookedTransformer.from_pretrained_no_processing(
-            self.model_name,
-            device_map='auto',
-            torch_dtype=torch.bfloat16
-        )
-        
+        if self.quantization == "none":
+            # The weights are edited in place, so load a copy of the model other EasyLLMs can't pick up
+            # from the shared registry. Hooks alone only apply to this instance's generate calls.
+            self._load_private_model()
+        else:
+            self._load_model()
+
+        # A checkpoint can still ship quantized weights, so check what was actually loaded
+        edit_weights = self._weights_editable()
+
         # Calculate refusal direction
-        refusal_dir = self._get_refusal_direction(hooked_model)
+        refusal_dir = self._get_refusal_direction()
+        torch.cuda.empty_cache()
         
         # Create ablation hooks
         self.ablation_hooks = self._create_ablation_hooks(refusal_dir)
-        
+
+        if not edit_weights:
+            # The ablation hooks already remove the refusal direction on their own.
+            logger.warning("Model %s has quantized weights, abliterating with hooks only", self.model_name)
+            return self
+
         # Update model weights 
         self._orthogonalize_weights(refusal_dir)
 
         return self
 
-    def _get_refusal_direction(self, model):
+    def _weights_editable(self) -> bool:
+        """
+        Whether the model's weights can be orthogonalized in place.
+
+        Only dense floating point matrices can: 4-bit weights are packed NF4 blocks and 8-bit weights are
+        int8 with separate scales, so subtracting a float update from them would corrupt the model. Only
+        an unquantized model is loaded as a private copy, so only that one may be edited.
+        """
+        if self.quantization != "none":
+            return False
+        if getattr(self.model, "is_loaded_in_4bit", False) or getattr(self.model, "is_loaded_in_8bit", False):
+            return False
+
+        weights = [self.model.get_input_embeddings().weight]
+        for layer in self.model.base_model.layers:
+            weights += [layer.self_attn.o_proj.weight, layer.mlp.down_proj.weight]
+        return all(weight.dtype.is_floating_point for weight in weights)
+
+    def _get_refusal_direction(self):
         """Calculate refusal direction from harmful/harmless activations"""
-        def get_act_idx(cache_dict, act_name, layer):
-            key = (act_name, layer)
-            return cache_dict[utils.get_act_name(*key)]
+        # Imported here since only abliteration needs datasets
+        from datasets import load_dataset
 
-        # Load datasets
-        def get_harmful_instructions():
-            dataset = load_dataset('mlabonne/harmful_behaviors')
-            return [[{"role": "user", "content": text}] for text in dataset['train']['text']]
+        # Stream only the rows that are used rather than downloading and decoding the whole dataset
+        def get_instructions(path, count):
+            dataset = load_dataset(path, split='train', streaming=True)
+            return [[{"role": "user", "content": row['text']}] for row in dataset.take(count)]
 
-        def get_harmless_instructions():  
-            dataset = load_dataset('mlabonne/harmless_alpaca')
-            return [[{"role": "user", "content": text}] for text in dataset['train']['text']]
+        harmful_inst = get_instructions('mlabonne/harmful_behaviors', 256)
+        harmless_inst = get_instructions('mlabonne/harmless_alpaca', 256)
 
-        harmful_inst, harmless_inst = get_harmful_instructions()[:256], get_harmless_instructions()[:256]
+        # hidden_states[layer] is the residual stream entering that decoder layer (resid_pre). The last
+        # entry has the final norm applied, so only layers 1 to n_layers - 1 are compared.
+        n_layers = self.model.config.num_hidden_layers
 
-        # Process in batches
+        # Process in batches, keeping only running sums of the last-position activations. Only their
+        # means are needed, so the hidden states are dropped after every batch.
         batch_size = 32
-        harmful = defaultdict(list)
-        harmless = defaultdict(list)
+        harmful_sums = {}
+        harmless_sums = {}
+        harmful_count = 0
+        harmless_count = 0
 
         for i in range(0, len(harmful_inst), batch_size):
             batch_harmful = harmful_inst[i:i + batch_size]
             batch_harmless = harmless_inst[i:i + batch_size]
 
-            harmful_tokens = self.tokenizer.apply_chat_template(batch_harmful, return_tensors="pt")
-            harmless_tokens = self.tokenizer.apply_chat_template(batch_harmless, return_tensors="pt")
-
-            # Cache activations
-            _, harmful_cache = model.run_with_cache(harmful_tokens, names_filter=lambda x: 'resid' in x)
-            _, harmless_cache = model.run_with_cache(harmless_tokens, names_filter=lambda x: 'resid' in x)
-
-            for key in harmful_cache:
-                harmful[key].append(harmful_cache[key])
-                harmless[key].append(harmless_cache[key])
-
-            gc.collect()
+            # Pad the ragged prompts into one batch; left padding keeps the last real token at position -1
+            harmful_tokens = self._pad_inputs(self.tokenizer.apply_chat_template(
+                batch_harmful, return_tensors="pt", return_dict=True, padding=True, truncation=True, max_length=512
+            )).to(self.model.device)
+            harmless_tokens = self._pad_inputs(self.tokenizer.apply_chat_template(
+                batch_harmless, return_tensors="pt", return_dict=True, padding=True, truncation=True, max_length=512
+            )).to(self.model.device)
+
+            # A plain forward pass keeps the model's fused attention kernels. No autograd graph is needed
+            # for the activations, and bf16 autocast keeps any fp32 layers on the fast path.
+            with torch.inference_mode(), torch.autocast("cuda", dtype=torch.bfloat16):
+                harmful_states = self.model(**harmful_tokens, output_hidden_states=True, use_cache=False).hidden_states
+                harmless_states = self.model(**harmless_tokens, output_hidden_states=True, use_cache=False).hidden_states
+
+            for layer in range(1, n_layers):
+                act_dtype = harmful_states[layer].dtype
+                harmful_sum = harmful_states[layer][:, -1, :].float().sum(dim=0)
+                harmless_sum = harmless_states[layer][:, -1, :].float().sum(dim=0)
+                harmful_sums[layer] = harmful_sums[layer] + harmful_sum if layer in harmful_sums else harmful_sum
+                harmless_sums[layer] = harmless_sums[layer] + harmless_sum if layer in harmless_sums else harmless_sum
+
+            harmful_count += harmful_tokens["input_ids"].shape[0]
+            harmless_count += harmless_tokens["input_ids"].shape[0]
+
+            del harmful_states, harmless_states
             torch.cuda.empty_cache()
 
-        # Concatenate cached activations
-        harmful = {k: torch.cat(v) for k, v in harmful.items()}
-        harmless = {k: torch.cat(v) for k, v in harmless.items()}
+        # Calculate refusal direction for every layer
+        refusal_directions = []
+        for layer in range(1, n_layers):
+            harmful_mean = (harmful_sums[layer] / harmful_count).to(act_dtype)
+            harmless_mean = (harmless_sums[layer] / harmless_count).to(act_dtype)
 
-        # Calculate refusal direction
-        activation_refusals = defaultdict(list)
-        activation_layers = ["resid_pre"]
-
-        for layer_num in range(1, model.cfg.n_layers):
-            pos = -1
-            for layer in activation_layers:
-                harmful_mean = get_act_idx(harmful, layer, layer_num)[:, pos, :].mean(dim=0)
-                harmless_mean = get_act_idx(harmless, layer, layer_num)[:, pos, :].mean(dim=0)
-                
-                refusal_dir = harmful_mean - harmless_mean
-                refusal_dir = refusal_dir / refusal_dir.norm()
-                activation_refusals[layer].append(refusal_dir)
+            refusal_dir = harmful_mean - harmless_mean
+            refusal_dir = refusal_dir / refusal_dir.norm()
+            refusal_directions.append(refusal_dir)
 
         # Get best refusal direction
-        refusal_directions = [
-            activation_refusals[layer][l-1]
-            for l in range(1, model.cfg.n_layers) 
-            for layer in activation_layers
-        ]
-        
         return sorted(refusal_directions, key=lambda x: abs(x.mean()), reverse=True)[9]
 
     def _create_ablation_hooks(self, refusal_dir):
-        """Create hooks to ablate refusal direction during generation"""
-        def direction_ablation_hook(
-            activation: Float[Tensor, "... d_act"],
-            hook: HookPoint, 
-            direction: Float[Tensor, "d_act"],
-        ):
-            if activation.device != direction.device:
-                direction = direction.to(activation.device)
-            proj = (
-                einops.einsum(
-                    activation, direction.view(-1, 1),
-                    "... d_act, d_act single -> ... single"
-                )
-                * direction
-            )
-            return activation - proj
+        """
+        Create hooks to ablate refusal direction during generation.
+
+        The direction is removed from the residual stream entering every decoder layer and from the
+        attention and MLP outputs written back into it. The stream is linear in those parts, so this
+        also removes it from the mid and post residuals without hooking them separately.
+
+        Returns:
+            list: (module, hook, is_pre_hook) tuples, applied by _ablation_hooks_applied.
+        """
+        # The hooks run at every layer for every generated token, so keep a copy of the direction per
+        # device and dtype rather than converting it on each call
+        directions = {}
+
+        def ablate(activation: torch.Tensor) -> torch.Tensor:
+            key = (activation.device, activation.dtype)
+            direction = directions.get(key)
+            if direction is None:
+                direction = directions[key] = refusal_dir.to(device=activation.device, dtype=activation.dtype)
+            coef = torch.matmul(activation, direction)
+            return activation - coef.unsqueeze(-1) * direction
+
+        def resid_pre_hook(module, args, kwargs):
+            # Decoder layers take hidden_states positionally or by keyword depending on the version
+            if args:
+                return (ablate(args[0]),) + tuple(args[1:]), kwargs
+            return args, {**kwargs, "hidden_states": ablate(kwargs["hidden_states"])}
+
+        def output_hook(module, args, output):
+            return ablate(output)
+
+        fwd_hooks = []
+        for layer in self.model.base_model.layers:
+            fwd_hooks.append((layer, resid_pre_hook, True))
+            fwd_hooks.append((layer.self_attn.o_proj, output_hook, False))
+            fwd_hooks.append((layer.mlp.down_proj, output_hook, False))
 
-        hook_fn = functools.partial(direction_ablation_hook, direction=refusal_dir)
-        
-        activation_layers = ["resid_pre", "resid_mid", "resid_post"]
-        fwd_hooks = [
-            (utils.get_act_name(act_name, layer), hook_fn)
-            for layer in range(self.model.config.num_hidden_layers)
-            for act_name in activation_layers
-        ]
-        
         return fwd_hooks
 
+    @contextlib.contextmanager
+    def _ablation_hooks_applied(self):
+        """
+        Registers the ablation hooks on the model for the duration of the block.
+        """
+        handles = []
+        try:
+            for module, hook, is_pre_hook in self.ablation_hooks:
+                if is_pre_hook:
+                    handles.append(module.register_forward_pre_hook(hook, with_kwargs=True))
+                else:
+                    handles.append(module.register_forward_hook(hook))
+            yield
+        finally:
+            for handle in handles:
+                handle.remove()
+
     def _orthogonalize_weights(self, refusal_dir):
         """Orthogonalize model weights against refusal direction"""
-        def get_orthogonalized_matrix(
-            matrix: Float[Tensor, "... d_model"],
-            vec: Float[Tensor, "d_model"]
-        ) -> Float[Tensor, "... d_model"]:
-            proj = (
-                einops.einsum(
-                    matrix, vec.view(-1, 1),
-                    "... d_model, d_model single -> ... single"
-                )
-                * vec
-            )
-            return matrix - proj
-
-        # Orthogonalize embeddings
-        if refusal_dir.device != self.model.get_input_embeddings().weight.device:
-            refusal_dir = refusal_dir.to(self.model.get_input_embeddings().weight.device)
-            
-        self.model.get_input_embeddings().weight.data = get_orthogonalized_matrix(
-            self.model.get_input_embeddings().weight,
-            refusal_dir
-        )
+        # Move the direction to each device once rather than checking per matrix
+        directions = {}
+
+        def direction_on(device):
+            if device not in directions:
+                directions[device] = refusal_dir.to(device=device)
+            return directions[device]
 
-        # Orthogonalize attention and MLP weights
+        # Embeddings are (vocab, d_model): remove the direction from every row, W -= (W v) v^T
+        embeddings = self.model.get_input_embeddings().weight.data
+        vec = direction_on(embeddings.device).to(embeddings.dtype)
+        embeddings.sub_(torch.outer(embeddings @ vec, vec))
+
+        # Attention and MLP output projections are (d_model, in) and write into the residual stream,
+        # so remove the direction from their outputs, W -= v (v^T W)
         for layer in self.model.base_model.layers:
-            if refusal_dir.device != layer.self_attn.o_proj.weight.device:
-                refusal_dir = refusal_dir.to(layer.self_attn.o_proj.weight.device)
-                
-            layer.self_attn.o_proj.weight.data = get_orthogonalized_matrix(
-                layer.self_attn.o_proj.weight,
-                refusal_dir
-            )
-            layer.mlp.down_proj.weight.data = get_orthogonalized_matrix(
-                layer.mlp.down_proj.weight, 
-                refusal_dir
-            )
+            for weight in (layer.self_attn.o_proj.weight.data, layer.mlp.down_proj.weight.data):
+                vec = direction_on(weight.device).to(weight.dtype)
+                weight.sub_(torch.outer(vec, vec @ weight))
+
+@functools.lru_cache(maxsize=None)
+def get_llm(
+    max_new_tokens: int = 1024,
+    model_name: str = None,
+    temperature: float = None,
+    cache_path: str = None,
+    compile_model: bool = False,
+    quantization: str = None,
+) -> EasyLLM:
+    """
+    Returns a shared EasyLLM for the given settings, creating it on first use.
+
+    Long-lived processes that simulate many channels reuse one instance, and so one loaded model,
+    tokenizer and worker pool, rather than building a new EasyLLM per run.
+
+    Args:
+        max_new_tokens (int): Maximum number of new tokens to generate in a response.
+        model_name (str): Name of the pretrained language model to use.
+        temperature (float): Sampling temperature, or None to use the model's default.
+        cache_path (str): Path of an on-disk response cache.
+        compile_model (bool): Whether to torch.compile the model's forward pass.
+        quantization (str): How to quantize the weights, one of QUANTIZATIONS, or None to go by the model name.
+
+    Returns:
+        EasyLLM: The shared instance for these settings.
+    """
+    return EasyLLM(max_new_tokens, model_name, temperature, cache_path, compile_model, quantization)
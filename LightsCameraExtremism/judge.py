@@ -3,23 +3,39 @@ from LightsCameraExtremism.easyLlm import EasyLLM
 
 import json
 
-class Judge(Agent):
-    def enforce(self, input):
-        prompt = (f"You are an expert social scientist. Your job is to review social network text and assess if it was written by an AI large language model."
-                  f"Assess the following text: '{input}'."
-                  f"Return your response in raw json, no surrounding text."
-                  )
+_SCHEMA_JSON = json.dumps({"RESULT":"A boolean representation of 'True' if the text is AI generated or 'False' if not.",
+                           "FEEDBACK":"Text on what could be improved to make the text meet the criteria."})
 
+# Role instructions are identical for every judgement, so they are sent as the system prompt.
+_SYSTEM_PROMPT = ("You are an expert social scientist. Your job is to review social network text and assess if it was written by an AI large language model."
+                  "Return your response in raw json, no surrounding text."
+                  )
 
-        schema = {"RESULT":"A boolean representation of 'True' if the text is AI generated or 'False' if not.",
-                  "FEEDBACK":"Text on what could be improved to make the text meet the criteria."}
-
-        schema = json.dumps(schema)
+class Judge(Agent):
+    def __init__(self, llm: EasyLLM):
+        """
+        Initialize the Judge agent.
 
-        model = self.llm.generate_pydantic_model_from_json_schema("Default", schema)
+        Args:
+            llm (EasyLLM): An instance of the EasyLLM class.
+        """
+        super().__init__(llm)
+        self._model = self.llm.generate_pydantic_model_from_json_schema("Default", _SCHEMA_JSON)
 
-        prompt = self.llm.generate_json_prompt(schema=model, query=prompt)
+    def enforce(self, input):
+        # A list of texts is judged in one batched generation
+        if isinstance(input, list):
+            prompts = [self._prompt(text) for text in input]
+            return self.llm.ask_questions(prompts, system_prompt=_SYSTEM_PROMPT)
 
-        response = self.llm.ask_question(prompt)
+        response = self.llm.ask_question(self._prompt(input), system_prompt=_SYSTEM_PROMPT)
         
         return response
+
+    def _prompt(self, input):
+        prompt = f"Assess the following text: '{input}'."
+
+        return self.llm.generate_json_prompt(schema=self._model, query=prompt)
+
+    async def aenforce(self, input):
+        return await self.llm.aask_question(self._prompt(input), system_prompt=_SYSTEM_PROMPT)
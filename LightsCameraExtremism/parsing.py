@@ -0,0 +1,117 @@
+import json
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import json5
+except ImportError:
+    json5 = None
+
+def json_loads(text: str) -> Any:
+    """
+    Parses JSON with orjson when it is installed, falling back to the standard library.
+
+    Both raise a json.JSONDecodeError subclass on invalid input.
+    """
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+def json_dumps(data: Any) -> str:
+    """
+    Serialises JSON with orjson when it is installed, falling back to the standard library.
+
+    Key order is kept, and the output is compact either way.
+    """
+    if orjson is not None:
+        return orjson.dumps(data).decode("utf-8")
+    return json.dumps(data, separators=(",", ":"))
+
+def try_parse(raw: str) -> Optional[Any]:
+    """
+    Extracts and parses the JSON object in a model response.
+
+    Args:
+        raw (str): The raw response from the language model.
+
+    Returns:
+        Optional[Any]: The parsed JSON data, or None if the response holds no parseable object.
+    """
+    candidate = extract_json_object(raw)
+    if candidate is None:
+        return None
+    return parse_json(candidate)
+
+def extract_json_object(text: str) -> Optional[str]:
+    """
+    Finds the JSON object starting at the first { in a model response, ignoring braces inside strings.
+
+    Only the first top-level object is considered: if it never closes (the response was cut off), None is
+    returned rather than one of the complete objects nested inside it.
+
+    Args:
+        text (str): The raw response from the language model.
+
+    Returns:
+        Optional[str]: The JSON object text, or None if the response contains no complete object.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+
+    depth = 0
+    in_string = False
+    escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:index + 1]
+    return None
+
+def parse_json(candidate: str) -> Any:
+    """
+    Parses a JSON object extracted from a model response, tolerating common model mistakes.
+
+    Raw newlines inside strings are accepted, and json5 (when installed) handles trailing commas and
+    single quotes.
+
+    Args:
+        candidate (str): The JSON object text.
+
+    Returns:
+        Any: The parsed JSON data, or None if it could not be parsed.
+    """
+    try:
+        return json_loads(candidate)
+    except ValueError:
+        pass
+
+    try:
+        return json.loads(candidate, strict=False)
+    except ValueError:
+        pass
+
+    if json5 is not None:
+        try:
+            return json5.loads(candidate)
+        except ValueError:
+            pass
+
+    return None
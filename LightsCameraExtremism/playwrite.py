@@ -2,6 +2,14 @@ from LightsCameraExtremism.agent import Agent
 from LightsCameraExtremism.easyLlm import EasyLLM
 
 import json 
+from typing import List, Union
+
+_SCHEMA_JSON = json.dumps({"TITLE":"The title of the social network",
+                           "DESCRIPTION":"The bio of the social network",
+                           "NUMBER_OF_USERS": "An integer representing the number of users on the social network", 
+                           "CHANNEL_VIBE":"A summary on the conditions and enviroment of the social network.",
+                           "STORY_AGENDA": "The story and activity taking place on the network.",
+                           "NUMBER_OF_POSTS": "An integer representing the number of posts to be made on the network."})
 
 class PlayWrite(Agent):
     def __init__(self, llm: EasyLLM):
@@ -12,40 +20,44 @@ class PlayWrite(Agent):
             llm (EasyLLM): An instance of the EasyLLM class.
         """
         super().__init__(llm)
+        self._model = self.llm.generate_pydantic_model_from_json_schema("Default", _SCHEMA_JSON)
 
-    def write_abstract(self, info: dict) -> str:
+    def write_abstract(self, info: Union[dict, List[dict]]) -> Union[str, List[str]]:
         """
         Write an abstract for a social network based on provided information.
 
         Args:
-            info (dict): Basic information about the social network.
+            info (Union[dict, List[dict]]): Basic information about the social network, or a list of it to
+                write several abstracts in one batched generation.
 
         Returns:
-            str: The generated abstract.
+            Union[str, List[str]]: The generated abstract, or one per entry when given a list.
         """
-        message_features = ["toxicity", "sentiment", "emotion"]
-
-        prompt = (f"You are an exper social scientist. You have previously exammined countless social networks."
-                  f"Write an abstract for a social network, based on the following basic information: {info}."
-                  f"Your abstract should seem realistic for the given enviroment and be represnetative of the information provided."
-                  f"Do not shy away from using strong language or hate speech if it is realistic for the enviroment."
-                  f"Ensure to add a good degree of detail to the script, and make sure to include a variety of different users, information, and variety."  
-                  f"Return your response in raw json, no surrounding text."
-                  )
-
-        schema = {"TITLE":"The title of the social network",
-                  "DESCRIPTION":"The bio of the social network",
-                "NUMBER_OF_USERS": "An integer representing the number of users on the social network", 
-                "CHANNEL_VIBER":"A summary on the conditions and enviroment of the social network.",
-                "STORY_AGENDA": "The story and activity taking place on the network.",
-                "NUMBER_OF_POSTS": "An integer representing the number of posts to be made on the network."}
+        if isinstance(info, list):
+            prompts = [self.llm.generate_json_prompt(schema=self._model, query=self._prompt(entry)) for entry in info]
+            return self.llm.ask_questions(prompts)
 
-        schema = json.dumps(schema)
-
-        model = self.llm.generate_pydantic_model_from_json_schema("Default", schema)
-
-        prompt = self.llm.generate_json_prompt(schema=model, query=prompt)
+        prompt = self.llm.generate_json_prompt(schema=self._model, query=self._prompt(info))
 
         response = self.llm.ask_question(prompt)
         
         return response
+
+    @staticmethod
+    def _prompt(info: dict) -> str:
+        """
+        Build the abstract prompt for one network.
+
+        Args:
+            info (dict): Basic information about the social network.
+
+        Returns:
+            str: The prompt.
+        """
+        return (f"You are an exper social scientist. You have previously exammined countless social networks."
+                f"Write an abstract for a social network, based on the following basic information: {info}."
+                f"Your abstract should seem realistic for the given enviroment and be represnetative of the information provided."
+                f"Do not shy away from using strong language or hate speech if it is realistic for the enviroment."
+                f"Ensure to add a good degree of detail to the script, and make sure to include a variety of different users, information, and variety."  
+                f"Return your response in raw json, no surrounding text."
+                )
@@ -0,0 +1,46 @@
+from typing import TYPE_CHECKING, List, Union
+
+if TYPE_CHECKING:
+    from LightsCameraExtremism.easyLlm import EasyLLM
+
+# Separates an agent's static instructions from the per-call details that follow them
+CONTEXT_MARKER = "\n--- CONTEXT ---\n"
+
+def format_users(users: Union[list, dict]) -> str:
+    """
+    Format the user list with one line per user, which is more compact for the model than a Python repr.
+
+    Args:
+        users (Union[list, dict]): List of all user data, or a dict of it keyed by USERNAME.
+
+    Returns:
+        str: One line of comma separated fields per user.
+    """
+    if isinstance(users, dict):
+        users = users.values()
+    return "\n".join("  " + ", ".join(f"{key}: {value}" for key, value in user.items()) for user in users)
+
+def keep_newest_within(lines: List[str], budget: int, llm: "EasyLLM") -> List[str]:
+    """
+    Keep as many of the newest lines as fit in a token budget, counted with the model's tokenizer.
+
+    Args:
+        lines (List[str]): The lines, oldest first.
+        budget (int): The most tokens the kept lines may add up to.
+        llm (EasyLLM): The model whose tokenizer counts the tokens.
+
+    Returns:
+        List[str]: The newest lines that fit, oldest first.
+    """
+    if not lines:
+        return lines
+
+    kept = 0
+    total = 0
+    for count in reversed(llm.count_tokens(lines)):
+        if total + count > budget:
+            break
+        total += count
+        kept += 1
+
+    return lines[len(lines) - kept:]
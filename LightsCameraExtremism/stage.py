@@ -0,0 +1,284 @@
+import argparse
+import contextlib
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Final, Optional
+from LightsCameraExtremism.director import Director
+from LightsCameraExtremism.actor import Actor, has_post
+from LightsCameraExtremism.easyLlm import EasyLLM, QUANTIZATIONS, get_llm
+from pydantic import ValidationError
+from tqdm import tqdm
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_DATA: Final[dict] = {
+    "TITLE": "Radical Agenda",
+    "DESCRIPTION": "A channel used to share white supremacist messaging",
+    "NUMBER_OF_USERS": 10,
+    "CHANNEL_VIBE": "High amounts of hate speech, far-right-extremism, violent language, and misogynistic rhetoric.",
+    "STORY_AGENDA": "A social network talking about topics including the 2024 US election",
+    "NUMBER_OF_POSTS": 20,
+}
+
+# Number of times the script is generated before giving up on getting JSON in the correct format
+SCRIPT_ATTEMPTS: int = 5
+
+# Shapes of the records run_simulation returns and writes: compact is USER, TIME and POST; full adds the
+# script's PURPOSE and FEATURES, and the actor's REASONING when there is one
+RECORD_FORMATS = ("compact", "full")
+
+def write_channel_script(director: Director, channel_data: dict, actors: bool, attempts: int = SCRIPT_ATTEMPTS) -> tuple:
+    """
+    Have the director write the script for a channel, retrying with backoff when the JSON is malformed.
+
+    Args:
+        director (Director): The director writing the script.
+        channel_data (dict): The channel, with the same keys as CHANNEL_DATA.
+        actors (bool): Whether the posts will be written by actors, rather than alongside the script.
+        attempts (int): Number of times to generate the script before raising.
+
+    Returns:
+        tuple: The script's users and its SCRIPT entries.
+
+    Raises:
+        pydantic.ValidationError: If the last attempt is still malformed.
+    """
+    write_script = director.write_script if actors else director.write_script_with_posts
+
+    for attempt in range(1, attempts + 1):
+        try:
+            script_data: dict = write_script(
+                    channel_data["TITLE"],
+                    channel_data["DESCRIPTION"],
+                    channel_data["NUMBER_OF_USERS"],
+                    channel_data["CHANNEL_VIBE"],
+                    channel_data["STORY_AGENDA"],
+                    channel_data["NUMBER_OF_POSTS"],
+                )
+            return script_data["USERS"], script_data["SCRIPT"]
+        except ValidationError as error:
+            # The response wasn't JSON in the script's schema
+            if attempt == attempts:
+                raise
+            logger.warning("Script attempt %d was malformed (%r), retrying.", attempt, error)
+            time.sleep(min(2 ** (attempt - 1), 30))
+
+def encode_post(record: dict) -> bytes:
+    """
+    Serialise a post as one line of JSON.
+
+    Args:
+        record (dict): The post.
+
+    Returns:
+        bytes: The UTF-8 JSON, ending in a newline.
+    """
+    # orjson serialises straight to UTF-8 bytes, several times faster than the json module
+    if orjson is not None:
+        return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(record) + "\n").encode("utf-8")
+
+def save_post(output_file: Optional[BinaryIO], record: dict) -> None:
+    """
+    Write a post to the output file, if there is one, and flush it to disk.
+
+    Args:
+        output_file (Optional[BinaryIO]): The JSON Lines file, opened in binary mode, or None.
+        record (dict): The post, with USER, TIME and POST keys.
+    """
+    if output_file is None:
+        return
+
+    output_file.write(encode_post(record))
+    output_file.flush()
+
+def log_post(record: dict) -> None:
+    """
+    Log a post at INFO level, only serialising it when that level is enabled.
+
+    Args:
+        record (dict): The post.
+    """
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("%s", encode_post(record).decode("utf-8").rstrip("\n"))
+
+def make_record(post: dict, text: str, record_format: str, reasoning: str = None) -> dict:
+    """
+    Build the record of a written post.
+
+    Args:
+        post (dict): The post's SCRIPT entry.
+        text (str): The text of the post.
+        record_format (str): One of RECORD_FORMATS.
+        reasoning (str): The actor's reasoning behind the post, if it was written by one.
+
+    Returns:
+        dict: The record.
+    """
+    if record_format == "compact":
+        return {"USER":post["USER"], "TIME":post["TIME"],"POST":text}
+
+    record = {"USER":post["USER"], "TIME":post["TIME"], "PURPOSE":post["PURPOSE"], "FEATURES":post["FEATURES"], "POST":text}
+    if reasoning is not None:
+        record["REASONING"] = reasoning
+    return record
+
+def run_simulation(
+    channel_data: dict,
+    llm: EasyLLM,
+    *,
+    retry: bool = True,
+    record_format: str = "compact",
+    actors: bool = False,
+    cache_path: str = None,
+    output_path: str = None,
+    dedupe: bool = False,
+    show_progress: bool = True,
+) -> list:
+    """
+    Simulate one channel: write its script, then its posts.
+
+    Args:
+        channel_data (dict): The channel, with the same keys as CHANNEL_DATA.
+        llm (EasyLLM): The model shared by the director and actors.
+        retry (bool): Whether to regenerate a malformed script up to SCRIPT_ATTEMPTS times, rather than raise.
+        record_format (str): The shape of the returned and written records, one of RECORD_FORMATS.
+        actors (bool): Whether to write each post with an Actor instead of alongside the script.
+        cache_path (str): Path of the actors' on-disk post cache, if any. Only used with actors.
+        output_path (str): Path of a JSON Lines file each post is written to as soon as it is ready, if any.
+        dedupe (bool): Whether to reuse a user's earlier post for later posts with the same purpose and features.
+            Only used with actors.
+        show_progress (bool): Whether to show a progress bar of written posts.
+
+    Returns:
+        list: The written posts, as records in record_format.
+    """
+    if record_format not in RECORD_FORMATS:
+        raise ValueError(f"record_format must be one of {RECORD_FORMATS}, not {record_format!r}")
+    if not actors and (cache_path or dedupe):
+        # Without actors the posts are written with the script, so there is nothing to cache or dedupe
+        logger.warning("The post cache and dedupe only apply when posts are written by actors; ignoring them.")
+
+    director: Director = Director(llm)
+
+    users, script = write_channel_script(director, channel_data, actors, SCRIPT_ATTEMPTS if retry else 1)
+
+    # Opened before any posts are written and flushed after each one, so a failure part way through keeps
+    # every post written before it
+    with (open(output_path, "wb") if output_path else contextlib.nullcontext()) as output_file, \
+            tqdm(total=len(script), desc=str(channel_data["TITLE"]), unit="post", disable=not show_progress) as progress:
+        if not actors:
+            written_posts: list = []
+            for post in script:
+                record = make_record(post, post["CONTENT"], record_format)
+                written_posts.append(record)
+                save_post(output_file, record)
+                log_post(record)
+                progress.update()
+            return written_posts
+
+        users_by_name: dict = {user["USERNAME"]: user for user in users}
+
+        # Posts by users missing from the user list have no persona to write from
+        for post in script:
+            if post["USER"] not in users_by_name:
+                logger.warning("Skipping post by '%s', who is not in the script's user list.", post["USER"])
+                progress.update()
+        script = [post for post in script if post["USER"] in users_by_name]
+
+        actor: Actor = Actor(llm, cache_path=cache_path)
+
+        # With dedupe, posts already written for a (user, purpose, features) key, reused for repeats
+        posts_by_key: dict = {}
+
+        def post_key(post: dict) -> str:
+            return json.dumps([post["USER"], post["PURPOSE"], post["FEATURES"]], sort_keys=True, default=str)
+
+        # Posts with no dependency on each other are written in one batched generation
+        written_posts: list = []
+        for batch in director.plan_batches(script):
+            if dedupe:
+                to_write = [post for post in batch if post_key(post) not in posts_by_key]
+                for post, written_post in zip(to_write, actor.perform_actions_batch(channel_data, to_write, users_by_name, written_posts)):
+                    posts_by_key[post_key(post)] = written_post
+                batch_posts = [posts_by_key[post_key(post)] for post in batch]
+            else:
+                batch_posts = actor.perform_actions_batch(channel_data, batch, users_by_name, written_posts)
+
+            for post, written_post in zip(batch, batch_posts):
+                if not has_post(written_post):
+                    logger.warning("Skipping post by '%s' at %s, which never produced a usable response.", post["USER"], post["TIME"])
+                    progress.update()
+                    continue
+                record = make_record(post, written_post["POST"], record_format, written_post.get("REASONING"))
+                written_posts.append(record)
+                save_post(output_file, record)
+                log_post(record)
+                progress.update()
+
+        return written_posts
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Simulate a social network channel.")
+    parser.add_argument("--actors", action="store_true", help="Write each post with a separate Actor call instead of alongside the script.")
+    parser.add_argument("--temperature", type=float, default=None, help="Sampling temperature, or the model's default if not set.")
+    parser.add_argument("--quant", choices=QUANTIZATIONS, default=None, help="Quantize the model's weights; by default this follows the model name.")
+    parser.add_argument("--cache", default=None, help="Path of an on-disk cache of written posts, reused for 24 hours. Only used with --actors and a --temperature of at most 0.3.")
+    parser.add_argument("--retry", action=argparse.BooleanOptionalAction, default=True, help=f"Regenerate a malformed script up to {SCRIPT_ATTEMPTS} times.")
+    parser.add_argument("--record-format", choices=RECORD_FORMATS, default="compact", help="compact records are USER, TIME and POST; full adds PURPOSE, FEATURES and the actor's REASONING.")
+    parser.add_argument("--output", default=None, help="Path of a JSON Lines file each post is written to as soon as it is ready.")
+    parser.add_argument("--dedupe", action="store_true", help="With --actors, write each (user, purpose, features) combination once and reuse the post for repeats.")
+    parser.add_argument("--verbose", action="store_true", help="Log every post as it is written instead of showing a progress bar.")
+    parser.add_argument("--sweep", default=None, help="Path of a JSON list of channel configs (with the same keys as CHANNEL_DATA) to simulate instead of the built-in channel.")
+    parser.add_argument("--workers", type=int, default=4, help="Number of channels in a sweep simulated at once.")
+    parser.add_argument("--output-dir", default="sweep_output", help="Directory a sweep writes one <index>_<TITLE>.jsonl file per channel to.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(message)s")
+
+    llm: EasyLLM = get_llm(temperature=args.temperature, quantization=args.quant)
+
+    def simulate(channel_data: dict, output_path: str) -> list:
+        return run_simulation(
+            channel_data,
+            llm,
+            retry=args.retry,
+            record_format=args.record_format,
+            actors=args.actors,
+            cache_path=args.cache,
+            output_path=output_path,
+            dedupe=args.dedupe,
+            show_progress=not args.verbose,
+        )
+
+    if not args.sweep:
+        simulate(CHANNEL_DATA, args.output)
+        return
+
+    with open(args.sweep, "r", encoding="utf-8") as sweep_file:
+        configs: list = json.load(sweep_file)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    def run_one(index: int, config: dict) -> list:
+        # The index keeps channels with the same (or same once sanitised) title from sharing a file
+        file_name = f"{index:03d}_" + re.sub(r"[^\w-]+", "_", str(config["TITLE"])) + ".jsonl"
+        return simulate(config, os.path.join(args.output_dir, file_name))
+
+    # Every channel shares the one loaded model, and every generation, the judge's included, takes turns
+    # on it. Only prompt building, parsing and writing output for one channel overlap with generation for
+    # the others.
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        list(executor.map(run_one, range(len(configs)), configs))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+from LightsCameraExtremism.parsing import extract_json_object, try_parse
+
+
+def test_extracts_object_after_leading_prose():
+    text = 'Here is the post you asked for: {"POST": "hello"} Hope that helps!'
+    assert extract_json_object(text) == '{"POST": "hello"}'
+    assert try_parse(text) == {"POST": "hello"}
+
+
+def test_cut_off_object_returns_none():
+    text = '{"USERS": [{"USERNAME": "a"}, {"USERNAME": "b"}], "SCRIPT": [{"USER": "a", "TIME": "01/01/24'
+    assert extract_json_object(text) is None
+    assert try_parse(text) is None
+
+
+def test_cut_off_object_ignores_later_objects():
+    text = '{"SCRIPT": [{"USER": "a"} trailing text {"POST": "other"}'
+    assert extract_json_object(text) is None
+
+
+def test_braces_inside_strings_are_ignored():
+    text = '{"POST": "a } closing and { opening brace", "USER": "a"}'
+    assert extract_json_object(text) == text
+    assert try_parse(text) == {"POST": "a } closing and { opening brace", "USER": "a"}
+
+
+def test_escaped_quotes_inside_strings():
+    text = '{"POST": "she said \\"{not json}\\" and left", "USER": "a"} done'
+    assert try_parse(text) == {"POST": 'she said "{not json}" and left', "USER": "a"}
+
+
+def test_escaped_backslash_before_closing_quote():
+    text = '{"POST": "path\\\\", "USER": "a"}'
+    assert try_parse(text) == {"POST": "path\\", "USER": "a"}
+
+
+def test_raw_newline_inside_string():
+    assert try_parse('{"POST": "line one\nline two"}') == {"POST": "line one\nline two"}
+
+
+def test_no_object_returns_none():
+    assert extract_json_object("no json here") is None
+    assert try_parse("no json here") is None